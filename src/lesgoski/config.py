@@ -8,14 +8,22 @@ load_dotenv()
 
 # Database
 DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./flights.db")
+# SQLite page cache and memory-map sizes per connection (MiB); 0 disables mmap
+SQLITE_CACHE_MB: int = int(os.getenv("SQLITE_CACHE_MB", 64))
+SQLITE_MMAP_MB: int = int(os.getenv("SQLITE_MMAP_MB", 256))
 
 # Notifications
 NTFY_TOPIC: str = os.getenv("NTFY_TOPIC", "")
 WEBAPP_URL: str = os.getenv("WEBAPP_URL", "http://localhost:8000")
 
+# Web app — dev auto-reload (also makes Jinja re-check templates for changes)
+WEBAPP_RELOAD: bool = os.getenv("UVICORN_RELOAD", "true").lower() == "true"
+
 # Scanner
 SCAN_COOLDOWN_MINUTES: int = int(os.getenv("SCAN_COOLDOWN_MINUTES", 30))
 LOOKUP_HORIZON_DAYS: int = int(os.getenv("LOOKUP_HORIZON_DAYS", 120))
+# Concurrent Ryanair API requests per scan (network-bound)
+SCAN_WORKERS: int = int(os.getenv("SCAN_WORKERS", 8))
 
 # Matcher
 HOUR_TOLERANCE: int = int(os.getenv("HOUR_TOLERANCE", 1))
@@ -1,12 +1,25 @@
 # core/schemas.py
-from pydantic import BaseModel, Field, field_validator, model_validator
+from functools import cached_property
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
 from datetime import datetime
 import hashlib
 from typing import List
 from typing import Dict, Tuple
 
 
+def generate_flight_id(origin: str, destination: str, departure_time: datetime, adults: int) -> str:
+    """Stable 32-char hex id of a one-way flight: (origin, destination, departure, adults)."""
+    raw = b"%b_%b_%b_%d" % (
+        origin.encode(), destination.encode(), departure_time.isoformat().encode(), adults,
+    )
+    # Stays MD5: ids are primary keys of existing flights and deal references
+    return hashlib.md5(raw).hexdigest()
+
+
 class FlightSchema(BaseModel):
+    # Frozen: unique_id is derived from the fields and cached on first access
+    model_config = ConfigDict(frozen=True)
+
     departure_time: datetime
     arrival_time: datetime
     flight_number: str
@@ -18,10 +31,9 @@ class FlightSchema(BaseModel):
     destination_full: str
     adults: int = 1
 
-    @property
+    @cached_property
     def unique_id(self) -> str:
-        raw = f"{self.origin}_{self.destination}_{self.departure_time.isoformat()}_{self.adults}"
-        return hashlib.md5(raw.encode()).hexdigest()
+        return generate_flight_id(self.origin, self.destination, self.departure_time, self.adults)
 
 
 class DateRange(BaseModel):
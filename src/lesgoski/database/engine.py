@@ -2,13 +2,16 @@
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-from lesgoski.config import DATABASE_URL
+from lesgoski.config import DATABASE_URL, SQLITE_CACHE_MB, SQLITE_MMAP_MB
 
 # SQLite specific arguments:
 # check_same_thread=False is required for SQLite when using multiple threads
 connect_args = {}
 if "sqlite" in DATABASE_URL:
     connect_args["check_same_thread"] = False
+    # Larger per-connection prepared statement cache (pysqlite default is 128);
+    # the matcher and scanner issue many distinct but repeated statements.
+    connect_args["cached_statements"] = 512
 
 engine = create_engine(
     DATABASE_URL,
@@ -18,12 +21,23 @@ engine = create_engine(
 
 # Enable WAL journal mode for better concurrent read/write performance.
 # Critical when the web server and scheduler both access the same SQLite file.
+# Pooled connections run these once; synchronous=NORMAL is durable under WAL
+# (only the last commits can be lost on power failure) and skips the fsync per commit.
 if "sqlite" in DATABASE_URL:
     @event.listens_for(engine, "connect")
     def _set_sqlite_wal(dbapi_connection, connection_record):
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA journal_mode=WAL")
         cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        # Memory-map the file and keep a large page cache (defaults 256/64 MiB;
+        # negative cache_size is in KiB), so the matcher join reads from memory
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+        # Auto-checkpoint at 10000 pages (default 1000) so writers rarely stall on
+        # it; the scheduler checkpoints explicitly off the hot path (checkpoint_wal)
+        cursor.execute("PRAGMA wal_autocheckpoint=10000")
         cursor.close()
 
 # SessionLocal is the factory for creating new database sessions
@@ -39,47 +53,69 @@ def init_db():
     """
     # Import models here to ensure they are registered with Base.metadata before creation
     import lesgoski.database.models  # noqa: F401
+    from sqlalchemy import inspect
 
+    created = set(Base.metadata.tables) - set(inspect(engine).get_table_names())
     Base.metadata.create_all(bind=engine)
-    _run_migrations()
+    _run_migrations(created)
     seed_admin()
+    optimize_db()
 
 
-def _run_migrations():
-    """Run any pending column additions for existing tables."""
+def optimize_db():
+    """
+    Let SQLite refresh planner statistics where they have drifted (cheap no-op
+    otherwise). Run at startup and after the scheduler's bulk prunes.
+    """
+    if "sqlite" in DATABASE_URL:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+
+
+def checkpoint_wal():
+    """
+    Copy the WAL back into the database file and truncate it, so the larger
+    wal_autocheckpoint threshold is hit rarely. Run periodically by the scheduler.
+    """
+    if "sqlite" in DATABASE_URL:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def _run_migrations(created=frozenset()):
+    """
+    Run any pending column additions for existing tables.
+    Schema is inspected once up front and every pending step runs in a single
+    transaction, so a boot with nothing to do costs one metadata pass.
+    `created` names the tables create_all just added, for one-time backfills.
+    """
     from sqlalchemy import inspect, text
     inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    columns = {t: {c['name'] for c in inspector.get_columns(t)} for t in tables}
+    indexes = {t: {i['name'] for i in inspector.get_indexes(t)} for t in tables}
 
-    # Migration 1: Add user_id to search_profiles
-    if 'search_profiles' in inspector.get_table_names():
-        columns = [c['name'] for c in inspector.get_columns('search_profiles')]
-        if 'user_id' not in columns:
-            with engine.begin() as conn:
-                conn.execute(text(
-                    "ALTER TABLE search_profiles ADD COLUMN user_id INTEGER REFERENCES users(id)"
-                ))
+    with engine.begin() as conn:
+        # Migration 1: Add user_id to search_profiles
+        if 'search_profiles' in tables and 'user_id' not in columns['search_profiles']:
+            conn.execute(text(
+                "ALTER TABLE search_profiles ADD COLUMN user_id INTEGER REFERENCES users(id)"
+            ))
 
-    # Migration 2: Add favourite_profile_id to users
-    if 'users' in inspector.get_table_names():
-        columns = [c['name'] for c in inspector.get_columns('users')]
-        if 'favourite_profile_id' not in columns:
-            with engine.begin() as conn:
-                conn.execute(text(
-                    "ALTER TABLE users ADD COLUMN favourite_profile_id INTEGER REFERENCES search_profiles(id)"
-                ))
+        # Migration 2: Add favourite_profile_id to users
+        if 'users' in tables and 'favourite_profile_id' not in columns['users']:
+            conn.execute(text(
+                "ALTER TABLE users ADD COLUMN favourite_profile_id INTEGER REFERENCES search_profiles(id)"
+            ))
 
-    # Migration 3: Add is_admin to users
-    if 'users' in inspector.get_table_names():
-        columns = [c['name'] for c in inspector.get_columns('users')]
-        if 'is_admin' not in columns:
-            with engine.begin() as conn:
-                conn.execute(text(
-                    "ALTER TABLE users ADD COLUMN is_admin INTEGER NOT NULL DEFAULT 0"
-                ))
+        # Migration 3: Add is_admin to users
+        if 'users' in tables and 'is_admin' not in columns['users']:
+            conn.execute(text(
+                "ALTER TABLE users ADD COLUMN is_admin INTEGER NOT NULL DEFAULT 0"
+            ))
 
-    # Migration 4: Create invite_tokens table
-    if 'invite_tokens' not in inspector.get_table_names():
-        with engine.begin() as conn:
+        # Migration 4: Create invite_tokens table
+        if 'invite_tokens' not in tables:
             conn.execute(text("""
                 CREATE TABLE invite_tokens (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -95,9 +131,8 @@ def _run_migrations():
                 "CREATE UNIQUE INDEX ix_invite_tokens_token ON invite_tokens (token)"
             ))
 
-    # Migration 5: Create price_snapshots table
-    if 'price_snapshots' not in inspector.get_table_names():
-        with engine.begin() as conn:
+        # Migration 5: Create price_snapshots table
+        if 'price_snapshots' not in tables:
             conn.execute(text("""
                 CREATE TABLE price_snapshots (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -112,6 +147,84 @@ def _run_migrations():
                 "CREATE INDEX idx_snapshot_lookup ON price_snapshots (profile_id, destination_code, recorded_at)"
             ))
 
+        # Migration 6: Unique (profile, outbound, inbound) on deals — required by the matcher upsert
+        if 'deals' in tables and 'idx_deal_pair' not in indexes['deals']:
+            # Drop any duplicate pairs first, keeping the most recent row
+            conn.execute(text("""
+                DELETE FROM deals WHERE id NOT IN (
+                    SELECT MAX(id) FROM deals
+                    GROUP BY profile_id, outbound_flight_id, inbound_flight_id
+                )
+            """))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX idx_deal_pair ON deals (profile_id, outbound_flight_id, inbound_flight_id)"
+            ))
+
+        # Migration 7: adults-prefixed covering indexes for the matcher self-join;
+        # every flights lookup filters on adults, so the older origin-led indexes go
+        if 'flights' in tables:
+            if 'ix_flight_out' not in indexes['flights']:
+                conn.execute(text(
+                    "CREATE INDEX ix_flight_out ON flights "
+                    "(adults, origin, destination, departure_time, arrival_time, price, id)"
+                ))
+            if 'ix_flight_in' not in indexes['flights']:
+                conn.execute(text(
+                    "CREATE INDEX ix_flight_in ON flights (adults, destination, origin, departure_time)"
+                ))
+            for legacy in ('idx_route_date', 'idx_origin_adults'):
+                if legacy in indexes['flights']:
+                    conn.execute(text(f"DROP INDEX {legacy}"))
+
+        # Migration 8: Index for the scheduler's due-profile query
+        if 'search_profiles' in tables and 'idx_profiles_due' not in indexes['search_profiles']:
+            conn.execute(text(
+                "CREATE INDEX idx_profiles_due ON search_profiles (is_active, updated_at)"
+            ))
+
+        # Migration 9: Index for stale-flight pruning
+        if 'flights' in tables and 'idx_flight_updated' not in indexes['flights']:
+            conn.execute(text("CREATE INDEX idx_flight_updated ON flights (updated_at)"))
+
+        # Migration 10: Add match_fingerprint to search_profiles
+        if 'search_profiles' in tables and 'match_fingerprint' not in columns['search_profiles']:
+            conn.execute(text(
+                "ALTER TABLE search_profiles ADD COLUMN match_fingerprint VARCHAR"
+            ))
+
+        # Migration 11: Backfill profile_origins from the legacy origins JSON,
+        # once, on the boot where create_all added the table
+        if 'profile_origins' in created and 'search_profiles' in tables and "sqlite" in DATABASE_URL:
+            conn.execute(text("""
+                INSERT INTO profile_origins (profile_id, position, iata)
+                SELECT p.id, CAST(j.key AS INTEGER), j.value
+                FROM search_profiles p, json_each(p.origins) j
+                WHERE json_type(p.origins) = 'array'
+            """))
+
+        # Migration 12: Index for the matcher's stale-deal prune
+        if 'deals' in tables and 'ix_deal_profile_updated' not in indexes['deals']:
+            conn.execute(text(
+                "CREATE INDEX ix_deal_profile_updated ON deals (profile_id, updated_at)"
+            ))
+
+        # Migration 13: Index for listing a profile's deals cheapest-first
+        if 'deals' in tables and 'ix_deal_profile_price' not in indexes['deals']:
+            conn.execute(text(
+                "CREATE INDEX ix_deal_profile_price ON deals (profile_id, total_price_pp)"
+            ))
+
+        # Migration 14: Backfill profile_destinations from the legacy allowed_destinations
+        # JSON, once, on the boot where create_all added the table
+        if 'profile_destinations' in created and 'search_profiles' in tables and "sqlite" in DATABASE_URL:
+            conn.execute(text("""
+                INSERT INTO profile_destinations (profile_id, position, iata)
+                SELECT p.id, CAST(j.key AS INTEGER), j.value
+                FROM search_profiles p, json_each(p.allowed_destinations) j
+                WHERE json_type(p.allowed_destinations) = 'array'
+            """))
+
+
 def seed_admin():
     """
     Seeds the admin user from ADMIN_USERNAME / ADMIN_PASSWORD env vars.
@@ -152,11 +265,12 @@ def seed_admin():
                 admin.ntfy_topic = generate_ntfy_topic()
                 logger.info(f"Assigned ntfy_topic to admin '{ADMIN_USERNAME}'.")
 
-        orphaned = db.query(SearchProfile).filter(SearchProfile.user_id.is_(None)).all()
+        # One UPDATE for all orphans instead of loading and dirtying each profile
+        orphaned = db.query(SearchProfile).filter(SearchProfile.user_id.is_(None)).update(
+            {SearchProfile.user_id: admin.id}, synchronize_session=False
+        )
         if orphaned:
-            for p in orphaned:
-                p.user_id = admin.id
-            logger.info(f"Assigned {len(orphaned)} orphaned profile(s) to admin '{ADMIN_USERNAME}'.")
+            logger.info(f"Assigned {orphaned} orphaned profile(s) to admin '{ADMIN_USERNAME}'.")
 
         db.commit()
     except Exception as e:
@@ -7,6 +7,34 @@ from lesgoski.core.schemas import StrategyConfig
 import json
 
 
+def _json_list(instance, cache_key: str, raw: str | None) -> list[str]:
+    """
+    Decode a JSON list column once per raw string, cached on the instance and
+    invalidated by identity when the column is reassigned. Returns a fresh list
+    so callers can mutate it without touching the cache.
+    """
+    if not raw:
+        return []
+    cached = instance.__dict__.get(cache_key)
+    if cached is None or cached[0] is not raw:
+        cached = (raw, tuple(json.loads(raw) or ()))
+        instance.__dict__[cache_key] = cached
+    return list(cached[1])
+
+
+def _dump_json_list(instance, cache_key: str, value: list[str], keep_empty: bool = False) -> str | None:
+    """
+    Encode a list for a JSON list column (None when empty, unless keep_empty) and
+    prime the _json_list cache with it, so reading the list back after a write skips the parse.
+    """
+    if not value and not keep_empty:
+        instance.__dict__.pop(cache_key, None)
+        return None
+    raw = json.dumps(value)
+    instance.__dict__[cache_key] = (raw, tuple(value or ()))
+    return raw
+
+
 # --- Association table for profile sharing ---
 profile_viewers = Table(
     'profile_viewers', Base.metadata,
@@ -37,13 +65,11 @@ class User(Base):
 
     @property
     def excluded_destinations(self) -> list[str]:
-        if not self._excluded_destinations:
-            return []
-        return json.loads(self._excluded_destinations)
+        return _json_list(self, '_cached_excluded', self._excluded_destinations)
 
     @excluded_destinations.setter
     def excluded_destinations(self, value: list[str]):
-        self._excluded_destinations = json.dumps(value) if value else None
+        self._excluded_destinations = _dump_json_list(self, '_cached_excluded', value)
 
 
 class InviteToken(Base):
@@ -124,8 +150,47 @@ class Flight(Base):
     adults = Column(Integer, default=1)
 
     __table_args__ = (
-        Index('idx_route_date', 'origin', 'destination', 'departure_time'),
-        Index('idx_origin_adults', 'origin', 'adults'),
+        # Cover both sides of the matcher self-join (no row fetch per probe):
+        # outbound seeks (adults, origin), inbound seeks (adults, origin, destination)
+        Index('ix_flight_out', 'adults', 'origin', 'destination', 'departure_time', 'arrival_time', 'price', 'id'),
+        # Mirror for lookups by destination (flights returning to a home airport)
+        Index('ix_flight_in', 'adults', 'destination', 'origin', 'departure_time'),
+        # Stale-flight pruning range scan
+        Index('idx_flight_updated', 'updated_at'),
+    )
+
+
+class ProfileOrigin(Base):
+    """
+    One home airport of a SearchProfile, normalized out of the origins JSON
+    so the matcher can filter with an indexed subquery.
+    """
+    __tablename__ = 'profile_origins'
+
+    id = Column(Integer, primary_key=True)
+    profile_id = Column(Integer, ForeignKey('search_profiles.id'), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    iata = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index('idx_profile_origin', 'profile_id', 'iata'),
+    )
+
+
+class ProfileDestination(Base):
+    """
+    One allowed destination of a SearchProfile, normalized out of the
+    allowed_destinations JSON like ProfileOrigin.
+    """
+    __tablename__ = 'profile_destinations'
+
+    id = Column(Integer, primary_key=True)
+    profile_id = Column(Integer, ForeignKey('search_profiles.id'), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    iata = Column(String, nullable=False)
+
+    __table_args__ = (
+        Index('idx_profile_destination', 'profile_id', 'iata'),
     )
 
 
@@ -148,53 +213,73 @@ class SearchProfile(Base):
     updated_at = Column(DateTime, default=func.now())
     _notify_destinations = Column("notify_destinations", String, nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
+    # Digest of the matcher inputs at the last run; unchanged inputs skip re-matching
+    match_fingerprint = Column(String, nullable=True)
 
     user = relationship("User", back_populates="profiles", foreign_keys=[user_id])
     viewers = relationship("User", secondary=profile_viewers)
+    origin_rows = relationship(
+        "ProfileOrigin", cascade="all, delete-orphan", order_by="ProfileOrigin.position"
+    )
+    destination_rows = relationship(
+        "ProfileDestination", cascade="all, delete-orphan", order_by="ProfileDestination.position"
+    )
+
+    __table_args__ = (
+        # Scheduler "is due" lookup: active profiles by last update
+        Index('idx_profiles_due', 'is_active', 'updated_at'),
+    )
 
     @property
     def origins(self) -> list[str]:
         """Returns python list: ['PSA', 'BLQ']"""
-        if not self._origins:
-            return []
-        return json.loads(self._origins)
+        return _json_list(self, '_cached_origins', self._origins)
 
     @origins.setter
     def origins(self, value: list[str]):
-        self._origins = json.dumps(value)
+        # The JSON column serves reads (templates); profile_origins serves SQL filters
+        self._origins = _dump_json_list(self, '_cached_origins', value, keep_empty=True)
+        self.origin_rows = [ProfileOrigin(iata=code, position=i) for i, code in enumerate(value or [])]
 
     @property
     def allowed_destinations(self) -> list[str]:
-        if not self._allowed_destinations:
-            return []
-        return json.loads(self._allowed_destinations)
+        return _json_list(self, '_cached_allowed', self._allowed_destinations)
 
     @allowed_destinations.setter
     def allowed_destinations(self, value: list[str]):
-        self._allowed_destinations = json.dumps(value) if value else None
+        # Same split as origins: JSON for reads, profile_destinations for SQL filters
+        self._allowed_destinations = _dump_json_list(self, '_cached_allowed', value)
+        self.destination_rows = [
+            ProfileDestination(iata=code, position=i) for i, code in enumerate(value or [])
+        ]
 
     @property
     def notify_destinations(self) -> list[str]:
         """IATA codes of destinations with immediate notifications enabled (bell toggle)."""
-        if not self._notify_destinations:
-            return []
-        return json.loads(self._notify_destinations)
+        return _json_list(self, '_cached_notify', self._notify_destinations)
 
     @notify_destinations.setter
     def notify_destinations(self, value: list[str]):
-        self._notify_destinations = json.dumps(value) if value else None
+        self._notify_destinations = _dump_json_list(self, '_cached_notify', value)
 
     @property
     def strategy_object(self) -> StrategyConfig:
         """Parses the JSON string into a Pydantic object"""
-        if not self._strategy_object:
+        raw = self._strategy_object
+        if not raw:
             return None
-        return StrategyConfig.model_validate_json(self._strategy_object)
+        # Parsed once per raw JSON string; reassigning the column invalidates by identity
+        cached = self.__dict__.get('_cached_strategy')
+        if cached is None or cached[0] is not raw:
+            cached = (raw, StrategyConfig.model_validate_json(raw))
+            self.__dict__['_cached_strategy'] = cached
+        return cached[1]
 
     @strategy_object.setter
     def strategy_object(self, config: StrategyConfig):
         """Dumps Pydantic object back to JSON string"""
         self._strategy_object = config.model_dump_json()
+        self.__dict__.pop('_cached_strategy', None)
 
 
 class Deal(Base):
@@ -226,6 +311,14 @@ class Deal(Base):
     )
     profile = relationship("SearchProfile", foreign_keys=[profile_id])
 
+    __table_args__ = (
+        Index('idx_deal_pair', 'profile_id', 'outbound_flight_id', 'inbound_flight_id', unique=True),
+        # Matcher stale-deal prune: range scan on (profile, updated_at)
+        Index('ix_deal_profile_updated', 'profile_id', 'updated_at'),
+        # Deal listings and notifications: profile's deals already in price order
+        Index('ix_deal_profile_price', 'profile_id', 'total_price_pp'),
+    )
+
 
 class PriceSnapshot(Base):
     """
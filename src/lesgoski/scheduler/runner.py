@@ -1,11 +1,13 @@
 # scheduler/runner.py
 import logging
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 import schedule
+from sqlalchemy import delete, func, or_, select
 from datetime import datetime, timedelta
 from lesgoski.config import UPDATE_INTERVAL_MINUTES, FLIGHT_STALENESS_HOURS
-from lesgoski.database.engine import SessionLocal
+from lesgoski.database.engine import SessionLocal, checkpoint_wal, optimize_db
 from lesgoski.database.models import SearchProfile, Flight, ScanLog, Deal, PriceSnapshot
 from lesgoski.services.orchestrator import update_single_profile
 from lesgoski.services.notifier import send_daily_digest
@@ -17,6 +19,13 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 MAX_WORKERS = 3
+PRUNE_BATCH_SIZE = 1000
+
+# Long-lived pool: ticks submit work and return without waiting for it
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="lesgoski-upd")
+# Profiles submitted but not finished yet, so a slow update is not queued twice
+_in_flight: set[int] = set()
+_in_flight_lock = threading.Lock()
 
 
 def _update_profile_thread(profile_id: int, profile_name: str):
@@ -28,25 +37,32 @@ def _update_profile_thread(profile_id: int, profile_name: str):
         logger.error(f"Error updating profile {profile_name}: {e}", exc_info=True)
     finally:
         db.close()
+        with _in_flight_lock:
+            _in_flight.discard(profile_id)
+
+
+def _log_future_error(name: str):
+    def _callback(future):
+        exc = future.exception()
+        if exc is not None:
+            logger.error(f"Thread for {name} raised: {exc}", exc_info=exc)
+    return _callback
 
 
 def check_and_run_updates():
     """
     Polls the database for profiles that are due for an update.
     A profile is due if updated_at is NULL or older than UPDATE_INTERVAL_MINUTES.
-    Runs due profiles in parallel using a thread pool.
+    Submits due profiles to the shared thread pool without waiting for them.
     """
     db = SessionLocal()
     try:
-        profiles = db.query(SearchProfile).filter(SearchProfile.is_active).all()
-        now = datetime.now()
-        threshold = now - timedelta(minutes=UPDATE_INTERVAL_MINUTES)
-
-        due_profiles = []
-        for profile in profiles:
-            if not profile.updated_at or profile.updated_at < threshold:
-                due_profiles.append((profile.id, profile.name))
-
+        threshold = datetime.now() - timedelta(minutes=UPDATE_INTERVAL_MINUTES)
+        # Due-ness is decided in SQL (idx_profiles_due); only id/name leave the DB
+        due_profiles = db.query(SearchProfile.id, SearchProfile.name).filter(
+            SearchProfile.is_active,
+            or_(SearchProfile.updated_at.is_(None), SearchProfile.updated_at < threshold),
+        ).all()
     except Exception as e:
         logger.error(f"Error in scheduler loop: {e}", exc_info=True)
         return
@@ -56,51 +72,75 @@ def check_and_run_updates():
     if not due_profiles:
         return
 
-    logger.info(f"Scheduling updates for {len(due_profiles)} profile(s)")
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {
-            executor.submit(_update_profile_thread, pid, name): name
-            for pid, name in due_profiles
-        }
-        for future in as_completed(futures):
-            name = futures[future]
-            try:
-                future.result()
-            except Exception as e:
-                logger.error(f"Thread for {name} raised: {e}", exc_info=True)
+    with _in_flight_lock:
+        to_submit = [(pid, name) for pid, name in due_profiles if pid not in _in_flight]
+        _in_flight.update(pid for pid, _ in to_submit)
+    if not to_submit:
+        return
+
+    logger.info(f"Scheduling updates for {len(to_submit)} profile(s)")
+    for pid, name in to_submit:
+        future = _executor.submit(_update_profile_thread, pid, name)
+        future.add_done_callback(_log_future_error(name))
+
+
+def _delete_in_batches(db, model, *criteria) -> int:
+    """
+    Delete rows matching `criteria` PRUNE_BATCH_SIZE at a time, committing after
+    each batch so the write lock is never held for the whole prune. Plain SQL
+    deletes: the prune session holds no loaded rows to keep in sync.
+    """
+    total = 0
+    while True:
+        batch_ids = select(model.id).where(*criteria).limit(PRUNE_BATCH_SIZE).scalar_subquery()
+        deleted = db.execute(
+            delete(model).where(model.id.in_(batch_ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        total += deleted
+        if deleted < PRUNE_BATCH_SIZE:
+            return total
+
+
+def _sql_ago(offset: str):
+    """
+    Cutoff computed by SQLite's clock, e.g. _sql_ago('-7 days'). 'localtime'
+    matches the naive local datetimes the app stores.
+    """
+    return func.datetime('now', 'localtime', offset)
 
 
 def prune_stale_data():
     """Remove stale flights and old scan_log entries."""
     db = SessionLocal()
     try:
-        now = datetime.now()
-
-        # Prune flights older than FLIGHT_STALENESS_HOURS
-        stale_threshold = now - timedelta(hours=FLIGHT_STALENESS_HOURS)
-        deleted_flights = db.query(Flight).filter(
-            Flight.updated_at < stale_threshold
-        ).delete()
-
-        # Prune deals whose flights were just deleted (orphaned FKs)
-        orphaned_deals = db.query(Deal).filter(
-            ~Deal.outbound_flight_id.in_(db.query(Flight.id)) |
-            ~Deal.inbound_flight_id.in_(db.query(Flight.id))
-        ).delete(synchronize_session="fetch")
+        # Prune flights older than FLIGHT_STALENESS_HOURS (idx_flight_updated)
+        deleted_flights = _delete_in_batches(
+            db, Flight, Flight.updated_at < _sql_ago(f"-{FLIGHT_STALENESS_HOURS} hours")
+        )
+
+        # Prune deals whose flights were just deleted (orphaned FKs): correlated
+        # NOT EXISTS probes the flights PK per deal, no session sync
+        orphaned_deals = db.execute(delete(Deal).where(or_(
+            ~select(Flight.id).where(Flight.id == Deal.outbound_flight_id).exists(),
+            ~select(Flight.id).where(Flight.id == Deal.inbound_flight_id).exists(),
+        )).execution_options(synchronize_session=False)).rowcount
+        db.commit()
 
         # Prune scan_log entries older than 7 days
-        old_logs = db.query(ScanLog).filter(
-            ScanLog.scanned_at < now - timedelta(days=7)
-        ).delete()
+        old_logs = _delete_in_batches(db, ScanLog, ScanLog.scanned_at < _sql_ago("-7 days"))
 
         # Prune price snapshots older than 365 days
-        old_snapshots = db.query(PriceSnapshot).filter(
-            PriceSnapshot.recorded_at < now - timedelta(days=365)
-        ).delete()
+        old_snapshots = _delete_in_batches(
+            db, PriceSnapshot, PriceSnapshot.recorded_at < _sql_ago("-365 days")
+        )
 
-        db.commit()
         if deleted_flights or orphaned_deals or old_logs or old_snapshots:
             logger.info(f"Pruned {deleted_flights} stale flights, {orphaned_deals} orphaned deals, {old_logs} old scan logs, {old_snapshots} old snapshots")
+
+        # Row counts just shifted; keep the planner's statistics in step
+        optimize_db()
     except Exception as e:
         db.rollback()
         logger.error(f"Pruning failed: {e}", exc_info=True)
@@ -119,20 +159,35 @@ def run_daily_digest():
         db.close()
 
 
+def run_wal_checkpoint():
+    """Checkpoint the SQLite WAL outside of any profile update."""
+    try:
+        checkpoint_wal()
+    except Exception as e:
+        logger.error(f"WAL checkpoint failed: {e}", exc_info=True)
+
+
 def main():
     """Entry point for the scheduler."""
     logger.info("Starting Polling Scheduler...")
 
     schedule.every(5).minutes.do(check_and_run_updates)
     schedule.every(1).hours.do(prune_stale_data)
+    schedule.every(30).minutes.do(run_wal_checkpoint)
     schedule.every().day.at("08:00").do(run_daily_digest)
 
     # Run once immediately on startup to catch up
     check_and_run_updates()
 
-    while True:
-        schedule.run_pending()
-        time.sleep(10)
+    try:
+        while True:
+            schedule.run_pending()
+            # Sleep until the next job is due instead of waking every few seconds
+            idle = schedule.idle_seconds()
+            time.sleep(max(1, idle) if idle is not None else 60)
+    finally:
+        # Drop updates still queued; let the ones already running commit
+        _executor.shutdown(wait=True, cancel_futures=True)
 
 
 if __name__ == "__main__":
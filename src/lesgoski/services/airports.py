@@ -38,9 +38,21 @@ def _load_airport_coords() -> dict[str, tuple[float, float]]:
     return coords
 
 
+_EARTH_RADIUS_KM = 6371.0
+
+
+@lru_cache(maxsize=1)
+def _load_airport_radians() -> dict[str, tuple[float, float, float]]:
+    """{IATA: (lat_rad, lon_rad, cos_lat)} — the per-airport trig inputs, computed once."""
+    return {
+        iata: (math.radians(lat), math.radians(lon), math.cos(math.radians(lat)))
+        for iata, (lat, lon) in _load_airport_coords().items()
+    }
+
+
 def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Great-circle distance between two points in km."""
-    R = 6371.0
+    R = _EARTH_RADIUS_KM
     rlat1, rlon1 = math.radians(lat1), math.radians(lon1)
     rlat2, rlon2 = math.radians(lat2), math.radians(lon2)
     dlat = rlat2 - rlat1
@@ -70,21 +82,40 @@ def get_nearby_airports(iata: str, radius_km: float | None = None) -> list[str]:
     if radius_km <= 0:
         return [iata]
 
-    h_lat, h_lon = coords[iata]
+    radians = _load_airport_radians()
+    h_lat, h_lon, h_cos = radians[iata]
+    # Compare the haversine term against the radius' own term instead of finishing
+    # each distance (no sqrt/atan2 per airport); beyond half the circumference
+    # every airport is in range
+    central = radius_km / _EARTH_RADIUS_KM
+    max_a = math.sin(central / 2) ** 2 if central < math.pi else 1.0
     nearby = [iata]
 
-    for other, (lat, lon) in coords.items():
+    for other, (lat, lon, cos_lat) in radians.items():
         if other == iata:
             continue
-        if _haversine_km(h_lat, h_lon, lat, lon) <= radius_km:
+        # Latitude alone bounds the distance from below: cheap reject first
+        if abs(lat - h_lat) > central:
+            continue
+        a = math.sin((lat - h_lat) / 2) ** 2 + h_cos * cos_lat * math.sin((lon - h_lon) / 2) ** 2
+        if a <= max_a:
             nearby.append(other)
 
     return nearby
 
 
-@lru_cache(maxsize=256)
 def get_nearby_set(iata: str, radius_km: float | None = None) -> frozenset[str]:
     """Cached frozenset version of get_nearby_airports — used by the matcher."""
+    if radius_km is None:
+        radius_km = NEARBY_AIRPORT_RADIUS_KM
+    return _nearby_set(iata, radius_km)
+
+
+# Adjacency memo: airports and radius are fixed for the process, so each airport's
+# neighbourhood is scanned at most once. Unbounded — at most one entry per airport
+# in the CSV (plus unknown codes) for the configured radius.
+@lru_cache(maxsize=None)
+def _nearby_set(iata: str, radius_km: float) -> frozenset[str]:
     return frozenset(get_nearby_airports(iata, radius_km))
 
 
@@ -1,7 +1,10 @@
 # services/grouping.py
 from collections import defaultdict
+from operator import attrgetter
 from lesgoski.services.airports import get_nearby_set
-from lesgoski.webapp.utils import get_country_code
+from lesgoski.webapp.utils import get_country_code, get_country_flag_url
+
+_price_pp = attrgetter("total_price_pp")
 
 
 def group_deals_by_destination(deals):
@@ -21,40 +24,34 @@ def group_deals_by_destination(deals):
     grouped = defaultdict(list)
     dest_full_names = {}
 
+    # One sort up front (linear when the caller already ordered by price in SQL):
+    # every group is then filled cheapest-first and needs no sort of its own.
+    # Keyed by id first, so a deal listed twice lands in its groups once.
+    deals = sorted({deal.id: deal for deal in deals}.values(), key=_price_pp)
+
+    # Read each deal's legs once; only codes that appear as actual direct
+    # flight airports become groups
+    direct_codes = set()
+    legs = []
     for deal in deals:
-        out_dest = deal.outbound.destination
-        in_origin = deal.inbound.origin
+        out, inb = deal.outbound, deal.inbound
+        out_dest, in_origin = out.destination, inb.origin
+        direct_codes.add(out_dest)
+        direct_codes.add(in_origin)
+        legs.append((deal, out_dest, in_origin))
 
-        area_codes = get_nearby_set(out_dest) | get_nearby_set(in_origin)
+        if out_dest not in dest_full_names:
+            dest_full_names[out_dest] = out.destination_full or out_dest
+        if in_origin not in dest_full_names:
+            dest_full_names[in_origin] = inb.origin_full or in_origin
+
+    for deal, out_dest, in_origin in legs:
+        area_codes = (get_nearby_set(out_dest) | get_nearby_set(in_origin)) & direct_codes
         for code in area_codes:
             grouped[code].append(deal)
 
-        for code, full_name in [
-            (out_dest, deal.outbound.destination_full or out_dest),
-            (in_origin, deal.inbound.origin_full or in_origin),
-        ]:
-            if code not in dest_full_names:
-                dest_full_names[code] = full_name
-
-    # Only keep codes that appear as actual direct flight airports
-    direct_codes = set()
-    for deal in deals:
-        direct_codes.add(deal.outbound.destination)
-        direct_codes.add(deal.inbound.origin)
-
     result = []
     for dest_code, deal_list in grouped.items():
-        if not deal_list or dest_code not in direct_codes:
-            continue
-
-        seen_ids = set()
-        unique_deals = []
-        for d in deal_list:
-            if d.id not in seen_ids:
-                seen_ids.add(d.id)
-                unique_deals.append(d)
-        unique_deals.sort(key=lambda x: x.total_price_pp)
-
         full_name = dest_full_names.get(dest_code, dest_code)
         country_code = get_country_code(full_name)
 
@@ -62,9 +59,9 @@ def group_deals_by_destination(deals):
             "destination_code": dest_code,
             "destination_name": full_name.split(',')[0].strip(),
             "country_code": country_code,
-            "country_flag": f"https://flagsapi.com/{country_code.upper()}/shiny/64.png",
-            "best_deal": unique_deals[0],
-            "other_deals": unique_deals[1:],
+            "country_flag": get_country_flag_url(country_code),
+            "best_deal": deal_list[0],
+            "other_deals": deal_list[1:],
         })
 
     result.sort(key=lambda x: x["best_deal"].total_price_pp)
@@ -1,17 +1,38 @@
 # services/matcher.py
+import hashlib
 import logging
 from sqlalchemy.orm import aliased, Session
-from sqlalchemy import and_
-from lesgoski.database.models import Flight, SearchProfile, Deal
+from sqlalchemy import DateTime, Integer, and_, case, cast, false, func, literal, or_, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_upsert
+from lesgoski.database.models import Flight, ProfileDestination, ProfileOrigin, SearchProfile, Deal
 from lesgoski.database.engine import SessionLocal
 from datetime import datetime
 from lesgoski.core.schemas import StrategyConfig
 from lesgoski.config import HOUR_TOLERANCE, NEARBY_AIRPORT_RADIUS_KM
-from lesgoski.services.airports import get_nearby_airports
+from lesgoski.services.airports import get_nearby_set
 
 logger = logging.getLogger(__name__)
 
 
+def _day_window_filter(departure_time, days: dict):
+    """
+    Allowed (weekday, hour window) pairs for one leg, with HOUR_TOLERANCE applied.
+    SQLite's %w counts from Sunday=0, Python's weekday() from Monday=0.
+    """
+    if not days:
+        return false()
+    dow = cast(func.strftime('%w', departure_time), Integer)
+    hour = cast(func.strftime('%H', departure_time), Integer)
+    return or_(*[
+        and_(
+            dow == (day + 1) % 7,
+            hour >= max(0, min_h - HOUR_TOLERANCE),
+            hour < min(24, max_h + HOUR_TOLERANCE),
+        )
+        for day, (min_h, max_h) in days.items()
+    ])
+
+
 class DealMatcher:
     def __init__(self, db: Session = None):
         self.db = db or SessionLocal()
@@ -37,7 +58,19 @@ class DealMatcher:
             logger.warning(f"Profile {profile.name} has no strategy config.")
             return 0
 
-        home_airports = profile.origins
+        # Home airports stay in SQLite as an indexed subquery on profile_origins
+        home_airports = (
+            select(ProfileOrigin.iata)
+            .where(ProfileOrigin.profile_id == profile.id)
+            .scalar_subquery()
+        )
+        excluded = profile.user.excluded_destinations if profile.user else []
+
+        # Same profile settings over the same flights give the same deals: skip the join
+        fingerprint = self._input_fingerprint(profile, home_airports, excluded)
+        if fingerprint == profile.match_fingerprint:
+            logger.info(f"No flight or profile changes for '{profile.name}', keeping existing deals.")
+            return self.db.query(Deal).filter(Deal.profile_id == profile.id).count()
 
         Outbound = aliased(Flight)
         Inbound = aliased(Flight)
@@ -50,27 +83,43 @@ class DealMatcher:
             Inbound.adults == profile.adults,
             Outbound.price + Inbound.price <= profile.max_price * 1.25,
             Inbound.departure_time > Outbound.arrival_time,
+            # Strategy filters (stay length, weekday, hour window) evaluated in SQLite
+            *self._strategy_filters(Outbound, Inbound, config),
         ]
 
-        # Apply allowed destinations filter if configured
-        allowed = profile.allowed_destinations
-        if allowed:
+        # Apply allowed destinations filter if configured, as an indexed
+        # subquery on profile_destinations like the home airports
+        allowed = None
+        if profile._allowed_destinations:
+            allowed = (
+                select(ProfileDestination.iata)
+                .where(ProfileDestination.profile_id == profile.id)
+                .scalar_subquery()
+            )
             base_filters.append(Outbound.destination.in_(allowed))
 
         # Exclude user's excluded destinations (e.g. already visited)
-        excluded = []
-        if profile.user:
-            excluded = profile.user.excluded_destinations
         if excluded:
             base_filters.append(~Outbound.destination.in_(excluded))
 
+        # Candidate pairs are shaped directly as deal rows and written by
+        # INSERT ... SELECT, so no candidate ever round-trips through Python.
+        candidate_cols = select(
+            literal(profile.id),
+            Outbound.id,
+            Inbound.id,
+            func.round(Outbound.price + Inbound.price, 2),
+            literal(match_start, DateTime),
+            false(),
+        ).select_from(Outbound)
+
         # --- Pass 1: strict join (same airport) — fast, handles most deals ---
         query_strict = (
-            self.db.query(Outbound, Inbound)
+            candidate_cols
             .join(Inbound, Outbound.destination == Inbound.origin)
-            .filter(*base_filters)
+            .where(*base_filters)
         )
-        candidates = list(query_strict.all())
+        candidate_queries = [query_strict]
 
         # --- Pass 2: cross-airport metro-area pairs ---
         # Only expand nearby airports for:
@@ -84,24 +133,22 @@ class DealMatcher:
         if NEARBY_AIRPORT_RADIUS_KM > 0:
             # Collect outbound destinations that actually exist in the DB
             # (only from flights departing our home airports).
-            all_out_dests = set(
-                r[0] for r in self.db.query(Flight.destination)
-                .filter(Flight.origin.in_(home_airports), Flight.adults == profile.adults)
-                .distinct()
-                .all()
+            dest_query = self.db.query(Flight.destination).filter(
+                Flight.origin.in_(home_airports), Flight.adults == profile.adults
             )
-            if allowed:
-                all_out_dests &= set(allowed)
+            if allowed is not None:
+                dest_query = dest_query.filter(Flight.destination.in_(allowed))
+            all_out_dests = set(r[0] for r in dest_query.distinct().all())
             if excluded:
                 all_out_dests -= set(excluded)
 
             for dest in all_out_dests:
-                nearby = get_nearby_airports(dest)
+                nearby = get_nearby_set(dest)
                 for apt in nearby:
                     if apt == dest:
                         continue  # same-airport already handled in Pass 1
                     query_cross = (
-                        self.db.query(Outbound, Inbound)
+                        candidate_cols
                         .join(
                             Inbound,
                             and_(
@@ -109,79 +156,88 @@ class DealMatcher:
                                 Inbound.origin == apt,
                             ),
                         )
-                        .filter(*base_filters)
+                        .where(*base_filters)
                     )
-                    candidates.extend(query_cross.all())
+                    candidate_queries.append(query_cross)
 
+        # Pass 1 and Pass 2 never yield the same pair (Pass 2 skips same-airport joins)
         num_matches = 0
-        seen = set()  # avoid duplicates from both passes
-        for out_f, in_f in candidates:
-            pair_key = (out_f.id, in_f.id)
-            if pair_key in seen:
-                continue
-            seen.add(pair_key)
-            if self._is_valid_match(out_f, in_f, config):
-                self._create_deal(profile, out_f, in_f)
-                num_matches += 1
-        self.db.flush()
-
-        # Prune deals that were not refreshed during this matching run.
+        for query in candidate_queries:
+            num_matches += self.db.execute(self._deal_upsert(query)).rowcount
+
+        # Prune deals that were not refreshed during this matching run
+        # (every deal written above is stamped with exactly match_start).
         self.db.query(Deal).filter(
             Deal.profile_id == profile.id,
             Deal.updated_at < match_start
         ).delete()
 
+        profile.match_fingerprint = fingerprint
         return num_matches
 
-    def _is_valid_match(self, out_f: Flight, in_f: Flight, config: StrategyConfig) -> bool:
-        # 1. Check Stay Duration (Nights)
-        nights = (in_f.departure_time.date() - out_f.departure_time.date()).days
-
-        if not (config.min_nights <= nights <= config.max_nights):
-            return False
-
-        # 2. Check Outbound Day & Time (with tolerance)
-        out_dow = out_f.departure_time.weekday()
-        if out_dow not in config.out_days:
-            return False
-
-        min_h, max_h = config.out_days[out_dow]
-        if not (max(0, min_h - HOUR_TOLERANCE) <= out_f.departure_time.hour < min(24, max_h + HOUR_TOLERANCE)):
-            return False
-
-        # 3. Check Inbound Day & Time (with tolerance)
-        in_dow = in_f.departure_time.weekday()
-        if in_dow not in config.in_days:
-            return False
-
-        min_h, max_h = config.in_days[in_dow]
-        if not (max(0, min_h - HOUR_TOLERANCE) <= in_f.departure_time.hour < min(24, max_h + HOUR_TOLERANCE)):
-            return False
-
-        return True
-
-    def _create_deal(self, profile, out_f, in_f):
-        # Check if this deal already exists for this profile
-        existing = self.db.query(Deal).filter_by(
-            profile_id=profile.id,
-            outbound_flight_id=out_f.id,
-            inbound_flight_id=in_f.id
-        ).first()
-
-        actual_price_pp = round(out_f.price + in_f.price, 2)
-        if existing:
-            existing.updated_at = datetime.now()
-            if existing.total_price_pp != actual_price_pp:
-                # prezzo cambiato, aggiorno
-                existing.total_price_pp = actual_price_pp
-                existing.notified = False
-        else:
-            new_deal = Deal(
-                profile_id=profile.id,
-                outbound_flight_id=out_f.id,
-                inbound_flight_id=in_f.id,
-                total_price_pp=actual_price_pp,
-                updated_at=datetime.now(),
-                notified=False
-            )
-            self.db.add(new_deal)
+    def _input_fingerprint(self, profile: SearchProfile, home_airports, excluded: list[str]) -> str:
+        """
+        Digest of everything a match depends on: the profile's matching settings
+        and an aggregate (count, newest update, price total) over the flights that
+        can form one of its round trips, i.e. leaving from or returning to a home airport.
+        """
+        # Two index-driven legs (ix_flight_out / ix_flight_in) instead of one OR,
+        # which SQLite can only answer with a full scan; the second leg skips
+        # flights the first already counted
+        legs = union_all(
+            select(Flight.updated_at, Flight.price).where(
+                Flight.adults == profile.adults, Flight.origin.in_(home_airports),
+            ),
+            select(Flight.updated_at, Flight.price).where(
+                Flight.adults == profile.adults,
+                Flight.destination.in_(home_airports),
+                Flight.origin.not_in(home_airports),
+            ),
+        ).subquery()
+        flights_state = self.db.execute(
+            select(func.count(), func.max(legs.c.updated_at), func.total(legs.c.price))
+        ).one()
+        raw = repr((
+            tuple(flights_state), profile._origins, profile.adults, profile.max_price,
+            profile._allowed_destinations, profile._strategy_object, sorted(excluded),
+            HOUR_TOLERANCE, NEARBY_AIRPORT_RADIUS_KM,
+        ))
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _strategy_filters(Outbound, Inbound, config: StrategyConfig) -> list:
+        """
+        Strategy rules (stay length, weekday and hour window per leg) as SQL
+        filters, so non-matching pairs never leave SQLite. Datetimes are stored
+        as ISO text, which strftime/julianday parse directly.
+        """
+        nights = (
+            func.julianday(func.date(Inbound.departure_time))
+            - func.julianday(func.date(Outbound.departure_time))
+        )
+        return [
+            nights.between(config.min_nights, config.max_nights),
+            _day_window_filter(Outbound.departure_time, config.out_days),
+            _day_window_filter(Inbound.departure_time, config.in_days),
+        ]
+
+    @staticmethod
+    def _deal_upsert(candidates):
+        # INSERT ... SELECT upsert keyed on (profile, outbound, inbound): refresh
+        # updated_at, and reset `notified` only when the price actually changed.
+        stmt = sqlite_upsert(Deal).from_select(
+            ['profile_id', 'outbound_flight_id', 'inbound_flight_id',
+             'total_price_pp', 'updated_at', 'notified'],
+            candidates,
+        )
+        return stmt.on_conflict_do_update(
+            index_elements=['profile_id', 'outbound_flight_id', 'inbound_flight_id'],
+            set_={
+                'updated_at': stmt.excluded.updated_at,
+                'total_price_pp': stmt.excluded.total_price_pp,
+                'notified': case(
+                    (Deal.total_price_pp != stmt.excluded.total_price_pp, False),
+                    else_=Deal.notified,
+                ),
+            }
+        )
@@ -1,12 +1,24 @@
 # services/notifier.py
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from sqlalchemy.orm import Session, joinedload
-from lesgoski.database.models import Deal, SearchProfile
+from requests.adapters import HTTPAdapter
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from lesgoski.database.models import Deal, Flight, SearchProfile
 from lesgoski.config import NTFY_TOPIC, WEBAPP_URL
 
 logger = logging.getLogger(__name__)
 
+# One pooled HTTP session for every ntfy push: keep-alive reuses the TLS
+# connection to ntfy.sh across posts instead of a fresh handshake per post
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+# Pushes for one batch are posted concurrently, so K notifications cost about
+# one round trip instead of K
+_post_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="lesgoski-ntfy")
+
 
 def _get_ntfy_url(profile: SearchProfile) -> str | None:
     """Resolve the ntfy URL for a profile: per-user topic first, global fallback."""
@@ -20,19 +32,42 @@ def _get_ntfy_url(profile: SearchProfile) -> str | None:
     return f"https://ntfy.sh/{topic}"
 
 
-def _build_booking_url(deal: Deal) -> str:
-    """Build a simple Ryanair search URL for the deal."""
-    out = deal.outbound
-    adults = deal.profile.adults or 1
-    d_out = out.departure_time.strftime("%Y-%m-%d")
-    d_in = deal.inbound.departure_time.strftime("%Y-%m-%d")
-    return (
-        f"https://www.ryanair.com/it/it/trip/flights/select"
-        f"?adults={adults}&teens=0&children=0&infants=0"
-        f"&dateOut={d_out}&dateIn={d_in}"
-        f"&originIata={out.origin}&destinationIata={out.destination}"
-        f"&isReturn=true"
+def _cheapest_deals_query(db: Session, *criteria):
+    """
+    Query for the cheapest deal per (profile, outbound destination) among the
+    deals matching `criteria`, ranked in SQL so the pricier ones never load.
+    Callers selectinload the flights: deals share them, and one IN query per
+    side fetches each flight once instead of repeating it on every deal row.
+    """
+    ranked = (
+        select(Deal.id, func.row_number().over(
+            partition_by=(Deal.profile_id, Flight.destination),
+            order_by=(Deal.total_price_pp, Deal.id),
+        ).label("rn"))
+        .join(Flight, Flight.id == Deal.outbound_flight_id)
+        .where(*criteria)
+        .subquery()
     )
+    return db.query(Deal).join(ranked, Deal.id == ranked.c.id).filter(ranked.c.rn == 1)
+
+
+def _post_all(messages: list[tuple[str, str, dict, str]]) -> list[str]:
+    """
+    Post (label, url, headers, body) messages to ntfy concurrently on the shared
+    pool. Failures are logged per message; returns the labels that were sent.
+    """
+    futures = [
+        (label, _post_pool.submit(_session.post, url, headers=headers, data=body, timeout=10))
+        for label, url, headers, body in messages
+    ]
+    sent = []
+    for label, future in futures:
+        try:
+            future.result()
+            sent.append(label)
+        except Exception as e:
+            logger.error(f"Failed to send {label}: {e}")
+    return sent
 
 
 def _webapp_deal_url(profile_id: int, dest_code: str) -> str:
@@ -56,32 +91,36 @@ def notify_new_deals(db: Session, profile: SearchProfile):
         logger.warning("No ntfy topic for profile %s, skipping notifications.", profile.name)
         return
 
-    actual_deals = (
-        db.query(Deal)
-        .options(joinedload(Deal.outbound), joinedload(Deal.inbound), joinedload(Deal.profile))
-        .filter(
-            Deal.profile_id == profile.id,
-        )
-        .order_by(Deal.total_price_pp)
-        .all()
-    )
-
-    if not actual_deals:
+    # Destinations with a deal that is new or changed price since the last run
+    # (the matcher resets `notified` on those), fetched as bare codes
+    pending_dests = {
+        dest for (dest,) in db.query(Flight.destination)
+        .join(Deal, Deal.outbound_flight_id == Flight.id)
+        .filter(Deal.profile_id == profile.id, Deal.notified.is_(False))
+        .distinct()
+    }
+    if not pending_dests:
         return
 
-    # Group deals by destination — keep the cheapest (already sorted)
-    by_dest = {}
-    for deal in actual_deals:
-        dest = deal.outbound.destination
-        if dest not in by_dest:
-            by_dest[dest] = deal
-
     notify_dests = set(profile.notify_destinations or [])
-    sent = 0
 
     # --- Belled destination notifications (click → webapp deep-link) ---
-    belled = {dest: deal for dest, deal in by_dest.items() if dest in notify_dests}
+    # Only the cheapest new deal of each pending belled destination is loaded,
+    # so a pricier new deal never re-pushes one that was already sent
+    belled = {}
+    belled_dests = notify_dests & pending_dests
+    if belled_dests:
+        belled = {
+            deal.outbound.destination: deal
+            for deal in _cheapest_deals_query(
+                db, Deal.profile_id == profile.id, Deal.notified.is_(False),
+                Flight.destination.in_(belled_dests),
+            )
+            .options(selectinload(Deal.outbound), selectinload(Deal.inbound))
+            .order_by(Deal.total_price_pp)
+        }
 
+    messages = []
     for dest, deal in belled.items():
         out = deal.outbound
         inb = deal.inbound
@@ -93,26 +132,20 @@ def notify_new_deals(db: Session, profile: SearchProfile):
         body = f"{out.origin} -> {dest} {out_date} / {in_date}"
         url = _webapp_deal_url(profile.id, dest)
 
-        try:
-            requests.post(
-                ntfy_url,
-                headers={
-                    "Title": title,
-                    "Click": url,
-                    "Tags": "airplane",
-                    "Priority": "3",
-                },
-                data=body,
-                timeout=10,
-            )
-            sent += 1
-        except Exception as e:
-            logger.error(f"Failed to send notification for {dest}: {e}")
+        messages.append((f"notification for {dest}", ntfy_url, {
+            "Title": title,
+            "Click": url,
+            "Tags": "airplane",
+            "Priority": "3",
+        }, body))
 
-    # Mark all as notified
-    for deal in actual_deals:
-        deal.notified = True
-    db.flush()
+    sent = len(_post_all(messages))
+
+    # Mark all as notified in one UPDATE; deals already in the session are
+    # updated in place from the criteria, nothing else is loaded
+    db.query(Deal).filter(Deal.profile_id == profile.id, Deal.notified.is_(False)).update(
+        {Deal.notified: True}
+    )
 
     logger.info(f"Sent {sent} notifications for profile {profile.name}")
 
@@ -131,24 +164,19 @@ def send_daily_digest(db: Session):
     if not profiles:
         return
 
-    # Collect best deal per destination for each profile
+    # Best deal per destination for every profile in one query, cheapest first
+    best_by_profile = defaultdict(list)
+    for deal in (
+        _cheapest_deals_query(db, Deal.profile_id.in_([p.id for p in profiles]))
+        .options(selectinload(Deal.outbound), selectinload(Deal.inbound))
+        .order_by(Deal.profile_id, Deal.total_price_pp)
+    ):
+        best_by_profile[deal.profile_id].append(deal)
+
+    messages = []
     for profile in profiles:
-        best_by_dest = {}
-        deals = (
-            db.query(Deal)
-            .options(joinedload(Deal.outbound), joinedload(Deal.inbound), joinedload(Deal.profile))
-            .filter(
-                Deal.profile_id == profile.id,
-            )
-            .order_by(Deal.total_price_pp)
-            .all()
-        )
-        for deal in deals:
-            dest = deal.outbound.destination
-            if dest not in best_by_dest:  # already ordered
-                best_by_dest[dest] = deal
-
-        if not best_by_dest:
+        best_deals = best_by_profile.get(profile.id)
+        if not best_deals:
             continue
 
         ntfy_url = _get_ntfy_url(profile)
@@ -157,7 +185,7 @@ def send_daily_digest(db: Session):
 
         # Build digest message
         lines = []
-        for deal in list(best_by_dest.values())[:15]:  # top 15 to keep it readable
+        for deal in best_deals[:15]:  # top 15 to keep it readable
             out = deal.outbound
             dest_name = (out.destination_full or out.destination).split(",")[0].strip()
             out_date = out.departure_time.strftime("%d/%m")
@@ -167,18 +195,12 @@ def send_daily_digest(db: Session):
         body = "\n".join(lines)
         url = _webapp_profile_url(profile.id)
 
-        try:
-            requests.post(
-                ntfy_url,
-                headers={
-                    "Title": f"Daily Flight Digest - {profile.name}",
-                    "Click": url,
-                    "Tags": "globe_with_meridians",
-                    "Priority": "3",
-                },
-                data=body,
-                timeout=10,
-            )
-            logger.info(f"Daily digest sent for profile {profile.name} destinations")
-        except Exception as e:
-            logger.error(f"Failed to send daily digest: {e}")
+        messages.append((f"daily digest for profile {profile.name}", ntfy_url, {
+            "Title": f"Daily Flight Digest - {profile.name}",
+            "Click": url,
+            "Tags": "globe_with_meridians",
+            "Priority": "3",
+        }, body))
+
+    for label in _post_all(messages):
+        logger.info(f"Sent {label}")
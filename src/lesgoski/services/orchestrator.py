@@ -1,6 +1,6 @@
 # services/orchestrator.py
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from lesgoski.database.models import SearchProfile
 from lesgoski.services.scanner import FlightScanner
 from lesgoski.services.matcher import DealMatcher
@@ -11,12 +11,21 @@ from datetime import datetime
 logger = logging.getLogger(__name__)
 
 
-def update_single_profile(db: Session, profile_id: int):
+def update_single_profile(
+    db: Session,
+    profile_id: int,
+    scanner: FlightScanner = None,
+    matcher: DealMatcher = None,
+):
     """
     Runs the full Scanner -> Matcher -> Notifier cycle for a SINGLE profile.
     The scanner internally deduplicates via ScanLog to avoid repeated API calls.
+    Callers updating several profiles on one session can pass their own
+    scanner/matcher (bound to `db`) to reuse them; otherwise they are created here.
     """
-    profile = db.get(SearchProfile, profile_id)
+    # Every column is read somewhere in the cycle, so the row loads whole; the
+    # owner (excluded destinations, ntfy topic) comes along in the same SELECT
+    profile = db.get(SearchProfile, profile_id, options=[joinedload(SearchProfile.user)])
     if not profile or not profile.is_active:
         logger.info(f"Skipping update: Profile {profile_id} not found or inactive.")
         return
@@ -24,12 +33,12 @@ def update_single_profile(db: Session, profile_id: int):
     logger.info(f"Starting update for: {profile.name}")
     try:
         # 1. Scan (with dedup via ScanLog)
-        scanner = FlightScanner(db=db)
+        scanner = scanner or FlightScanner(db=db)
         count_flights = scanner.run(origins=profile.origins, adults=profile.adults)
         logger.info(f"  Scanned {count_flights} flights.")
 
         # 2. Match flights into deals
-        matcher = DealMatcher(db=db)
+        matcher = matcher or DealMatcher(db=db)
         count_deals = matcher.run(profile)
         logger.info(f"  Found {count_deals} matching deals.")
 
@@ -1,121 +1,204 @@
 # services/scanner.py
 import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
+from operator import attrgetter
 from ryanair import Ryanair
-from lesgoski.config import SCAN_COOLDOWN_MINUTES, LOOKUP_HORIZON_DAYS
-from lesgoski.core.schemas import FlightSchema
+from lesgoski.config import SCAN_COOLDOWN_MINUTES, LOOKUP_HORIZON_DAYS, SCAN_WORKERS
+from lesgoski.core.schemas import generate_flight_id
 from lesgoski.database.engine import SessionLocal
 from lesgoski.database.models import Flight, ScanLog
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from sqlalchemy.dialects.sqlite import insert as sqlite_upsert
 
 logger = logging.getLogger(__name__)
 
+# Flight upsert keyed on the id; built once and executed with a list of row dicts
+_FLIGHT_UPSERT = sqlite_upsert(Flight)
+_FLIGHT_UPSERT = _FLIGHT_UPSERT.on_conflict_do_update(
+    index_elements=['id'],
+    set_={
+        'price': _FLIGHT_UPSERT.excluded.price,
+        'updated_at': _FLIGHT_UPSERT.excluded.updated_at,
+        'departure_time': _FLIGHT_UPSERT.excluded.departure_time,
+        'arrival_time': _FLIGHT_UPSERT.excluded.arrival_time
+    }
+)
+
+# Fields read off each API flight, in one C-level call per flight
+_API_FLIGHT_FIELDS = attrgetter(
+    'origin', 'destination', 'departureTime', 'arrivalTime', 'flightNumber',
+    'price', 'currency', 'originFull', 'destinationFull', 'adults',
+)
+
+# One Ryanair client per worker thread, reused for every request that thread serves
+_thread_local = threading.local()
+
+# Shared by every scan in the process: the worker threads, and with them their
+# clients' pooled HTTPS connections, outlive a single run instead of paying
+# fresh TCP/TLS handshakes each time
+_scan_pool = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="lesgoski-scan")
+
+
+def _fetch_cheapest(airport: str, adults: int, date_from, date_to, destination_airport: str = None):
+    api = getattr(_thread_local, "api", None)
+    if api is None:
+        api = _thread_local.api = Ryanair(currency="EUR")
+    kwargs = {"destination_airport": destination_airport} if destination_airport else {}
+    return api.get_cheapest_flights(
+        airport=airport,
+        num_adults=adults,
+        date_from=date_from,
+        date_to=date_to,
+        **kwargs,
+    )
+
+
+# In-process memo of API results, shared by concurrent profile updates.
+# Entries live as long as the ScanLog cooldown, the same window in which a repeat
+# scan would be skipped anyway; concurrent callers with the same key wait on the
+# first request instead of repeating it.
+_fetch_cache: dict[tuple, tuple[float, Future]] = {}
+_fetch_cache_lock = threading.Lock()
+
+
+def _fetch_cached(airport: str, adults: int, date_from, date_to, destination_airport: str = None):
+    key = (airport, destination_airport, adults, date_from, date_to)
+    now = time.monotonic()
+    ttl = SCAN_COOLDOWN_MINUTES * 60
+    with _fetch_cache_lock:
+        entry = _fetch_cache.get(key)
+        owner = entry is None or now - entry[0] > ttl
+        if owner:
+            for stale in [k for k, (created, _) in _fetch_cache.items() if now - created > ttl]:
+                del _fetch_cache[stale]
+            future = Future()
+            _fetch_cache[key] = (now, future)
+        else:
+            future = entry[1]
+
+    if owner:
+        try:
+            future.set_result(_fetch_cheapest(airport, adults, date_from, date_to, destination_airport))
+        except Exception as e:
+            with _fetch_cache_lock:
+                _fetch_cache.pop(key, None)
+            future.set_exception(e)
+    return future.result()
+
 
 class FlightScanner:
     def __init__(self, db: Session = None):
-        self.api = Ryanair(currency="EUR")
         self.db = db or SessionLocal()
 
     def run(self, origins: list[str], adults: int) -> int:
         """
         Scan flights from the given origins for the given number of adults.
         Checks ScanLog to skip origins that were recently scanned.
+        API requests run on the shared scan pool; all DB writes stay on the calling thread.
         Returns total number of flights found.
         """
-        today = datetime.now().date()
+        now = datetime.now()
+        today = now.date()
         date_from = today
         date_to = today + timedelta(days=LOOKUP_HORIZON_DAYS)
         total_results = 0
-        cooldown_threshold = datetime.now() - timedelta(minutes=SCAN_COOLDOWN_MINUTES)
+        cooldown_threshold = now - timedelta(minutes=SCAN_COOLDOWN_MINUTES)
+
+        # Origins scanned recently for this adults count, in one query
+        recent = dict(self.db.query(ScanLog.origin, func.max(ScanLog.scanned_at)).filter(
+            ScanLog.origin.in_(origins),
+            ScanLog.adults == adults,
+            ScanLog.scanned_at > cooldown_threshold
+        ).group_by(ScanLog.origin).all())
 
+        due_origins = []
         for origin in origins:
-            # Check if this (origin, adults) was scanned recently
-            recent = self.db.query(ScanLog).filter(
-                ScanLog.origin == origin,
-                ScanLog.adults == adults,
-                ScanLog.scanned_at > cooldown_threshold
-            ).first()
-
-            if recent:
-                logger.info(f"Skipping {origin} (adults={adults}) — scanned at {recent.scanned_at}")
+            if origin in recent:
+                logger.info(f"Skipping {origin} (adults={adults}) — scanned at {recent[origin]}")
                 continue
-
-            logger.info(f"Scanning from {origin} (adults={adults})...")
-
-            # 1. Scan One-Way Outbound (Origin -> Anywhere)
-            raw_flights = self.api.get_cheapest_flights(
-                airport=origin,
-                num_adults=adults,
-                date_from=date_from,
-                date_to=date_to
-            )
-            self._bulk_upsert(raw_flights)
-            total_results += len(raw_flights)
-
-            # 2. Scan return legs for each discovered destination
-            destinations = {f.destination for f in raw_flights}
-
-            for dest in destinations:
-                raw_inbound = self.api.get_cheapest_flights(
-                    airport=dest,
-                    num_adults=adults,
-                    destination_airport=origin,
-                    date_from=date_from,
-                    date_to=date_to
-                )
-                self._bulk_upsert(raw_inbound)
-                total_results += len(raw_inbound)
-
-            # Log this scan
-            self.db.add(ScanLog(
-                origin=origin,
-                adults=adults,
-                scanned_at=datetime.now()
-            ))
-            self.db.flush()
+            due_origins.append(origin)
+
+        if not due_origins:
+            return 0
+
+        # 1. Scan One-Way Outbound (Origin -> Anywhere) for every due origin
+        logger.info(f"Scanning from {', '.join(due_origins)} (adults={adults})...")
+        pending = {
+            _scan_pool.submit(_fetch_cached, origin, adults, date_from, date_to): (origin, None)
+            for origin in due_origins
+        }
+        # Requests still outstanding per origin; an origin is logged once it reaches zero
+        remaining = dict.fromkeys(due_origins, 1)
+        failure = None
+        # Results are upserted here, on the calling thread, as each request completes,
+        # so DB writes overlap with the requests still in flight.
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                origin, dest = pending.pop(future)
+                try:
+                    raw_flights = future.result()
+                except Exception as e:
+                    # Let the other origins finish and log their scans; this one stays due
+                    failure = failure or e
+                    remaining.pop(origin, None)
+                    continue
+                self._bulk_upsert(raw_flights, now)
+                total_results += len(raw_flights)
+
+                if dest is None:
+                    # 2. Queue return legs for this origin's destinations right away
+                    for leg_dest in {f.destination for f in raw_flights}:
+                        leg = _scan_pool.submit(_fetch_cached, leg_dest, adults, date_from, date_to, origin)
+                        pending[leg] = (origin, leg_dest)
+                        remaining[origin] += 1
+
+                if origin in remaining:
+                    remaining[origin] -= 1
+                    if not remaining[origin]:
+                        # Log this origin's scan as soon as all of its legs are in
+                        del remaining[origin]
+                        self.db.add(ScanLog(origin=origin, adults=adults, scanned_at=datetime.now()))
+                        self.db.flush()
+
+        if failure is not None:
+            raise failure
 
         return total_results
 
-    def _bulk_upsert(self, api_flights):
+    def _bulk_upsert(self, api_flights, now: datetime = None):
         if not api_flights:
             return
 
-        upsert_data = []
-        for f in api_flights:
-            f_schema = FlightSchema(
-                departure_time=f.departureTime,
-                arrival_time=f.arrivalTime,
-                flight_number=f.flightNumber,
-                price=round(f.price, 2),
-                currency=f.currency,
-                origin=f.origin,
-                origin_full=f.originFull,
-                destination=f.destination,
-                destination_full=f.destinationFull,
-                adults=f.adults,
-            )
-
-            flight_data = f_schema.model_dump()
-            flight_data['id'] = f_schema.unique_id
-            flight_data['updated_at'] = datetime.now()
-            upsert_data.append(flight_data)
+        # Plain dicts straight from the (already typed) API objects; the
+        # FlightSchema validation round-trip is skipped on this hot path.
+        now = now or datetime.now()
+        upsert_data = [
+            {
+                'id': generate_flight_id(origin, destination, dep, adults),
+                'departure_time': dep,
+                'arrival_time': arr,
+                'flight_number': number,
+                'price': round(price, 2),
+                'currency': currency,
+                'origin': origin,
+                'origin_full': origin_full,
+                'destination': destination,
+                'destination_full': destination_full,
+                'adults': adults,
+                'updated_at': now,
+            }
+            for origin, destination, dep, arr, number, price, currency, origin_full, destination_full, adults
+            in map(_API_FLIGHT_FIELDS, api_flights)
+        ]
 
         if not upsert_data:
             return
 
-        # Execute Upsert (chunked) — single PK on id
-        chunk_size = 1000
-        for i in range(0, len(upsert_data), chunk_size):
-            chunk = upsert_data[i : i + chunk_size]
-            stmt = sqlite_upsert(Flight).values(chunk)
-            stmt = stmt.on_conflict_do_update(
-                index_elements=['id'],
-                set_={
-                    'price': stmt.excluded.price,
-                    'updated_at': stmt.excluded.updated_at,
-                    'departure_time': stmt.excluded.departure_time,
-                    'arrival_time': stmt.excluded.arrival_time
-                }
-            )
-            self.db.execute(stmt)
+        # One prepared single-row statement run as executemany: SQLite reuses
+        # the compiled plan for every row instead of parsing a large VALUES list.
+        self.db.execute(_FLIGHT_UPSERT, upsert_data)
@@ -1,8 +1,8 @@
 # services/stats.py
 import logging
-from datetime import datetime, date, timedelta
+from datetime import datetime, timedelta
 from statistics import mean
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from lesgoski.database.models import Deal, PriceSnapshot, SearchProfile
 from lesgoski.services.grouping import group_deals_by_destination
 
@@ -15,17 +15,31 @@ def record_price_snapshots(db: Session, profile: SearchProfile):
     per (profile, destination) per calendar day, keeping the day's lowest price.
     """
     deals = [
-        d for d in db.query(Deal).filter(Deal.profile_id == profile.id).all()
+        d for d in db.query(Deal)
+        .options(joinedload(Deal.outbound), joinedload(Deal.inbound))
+        .filter(Deal.profile_id == profile.id)
+        .all()
         if d.outbound and d.inbound
     ]
     if not deals:
         return
 
     groups = group_deals_by_destination(deals)
-    today = date.today()
+    now = datetime.now()
+    today = now.date()
     today_start = datetime(today.year, today.month, today.day)
     today_end = datetime(today.year, today.month, today.day, 23, 59, 59)
 
+    # Today's snapshots for this profile in one query, probed per destination
+    existing_by_dest = {
+        s.destination_code: s
+        for s in db.query(PriceSnapshot).filter(
+            PriceSnapshot.profile_id == profile.id,
+            PriceSnapshot.recorded_at >= today_start,
+            PriceSnapshot.recorded_at <= today_end,
+        ).all()
+    }
+
     for group in groups:
         dest_code = group["destination_code"]
         best_deal = group["best_deal"]
@@ -33,13 +47,7 @@ def record_price_snapshots(db: Session, profile: SearchProfile):
         departure = best_deal.outbound.departure_time
         advance_days = max(0, (departure.date() - today).days)
 
-        existing = db.query(PriceSnapshot).filter(
-            PriceSnapshot.profile_id == profile.id,
-            PriceSnapshot.destination_code == dest_code,
-            PriceSnapshot.recorded_at >= today_start,
-            PriceSnapshot.recorded_at <= today_end,
-        ).first()
-
+        existing = existing_by_dest.get(dest_code)
         if existing:
             if price < existing.best_price:
                 existing.best_price = price
@@ -50,7 +58,7 @@ def record_price_snapshots(db: Session, profile: SearchProfile):
                 destination_code=dest_code,
                 best_price=price,
                 advance_days=advance_days,
-                recorded_at=datetime.now(),
+                recorded_at=now,
             ))
 
     logger.debug(f"Recorded price snapshots for profile {profile.id} ({len(groups)} destinations)")
@@ -1,12 +1,14 @@
 # webapp/app.py
 import csv
-import json
+import hashlib
 import logging
+import uuid
+from datetime import date
 from functools import lru_cache
 from pathlib import Path
 from collections import defaultdict
 
-from lesgoski.webapp.utils import get_country_code, get_booking_links
+from lesgoski.webapp.utils import get_country_code, get_country_flag_url, get_booking_links
 from lesgoski.webapp.auth import (
     RedirectToLogin, get_current_user, require_user, require_admin,
     verify_password, hash_password, generate_ntfy_topic, generate_invite_token,
@@ -17,15 +19,17 @@ from lesgoski.services.grouping import group_deals_by_destination
 from lesgoski.services.stats import get_all_destination_stats, get_destination_stats
 from fastapi import FastAPI, Depends, Request, Form, BackgroundTasks, HTTPException
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session, joinedload
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from sqlalchemy import func, inspect as sa_inspect
+from sqlalchemy.orm import Session, joinedload, selectinload
 from starlette.middleware.sessions import SessionMiddleware
 from lesgoski.database.engine import get_db, init_db, SessionLocal
-from lesgoski.database.models import Deal, SearchProfile, User, BroskiRequest, InviteToken
+from lesgoski.database.models import Deal, PriceSnapshot, SearchProfile, User, BroskiRequest, InviteToken
 from lesgoski.core.schemas import StrategyConfig
 from lesgoski.services.orchestrator import update_single_profile
-from lesgoski.config import SECRET_KEY, WEBAPP_URL
+from lesgoski.config import SECRET_KEY, WEBAPP_URL, WEBAPP_RELOAD
 
 logging.basicConfig(
     level=logging.INFO,
@@ -48,6 +52,10 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory=str(_WEBAPP_DIR / "static")), name="static")
 
 templates = Jinja2Templates(directory=str(_WEBAPP_DIR / "templates"))
+# Compiled templates persist across restarts (per-user temp dir); outside dev
+# reload, templates are not stat'ed for changes on every render
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+templates.env.auto_reload = WEBAPP_RELOAD
 # Use CDN in dev (no built tailwind.css), pre-built CSS in production (Docker)
 _tailwind_css = _WEBAPP_DIR / "static" / "tailwind.css"
 templates.env.globals.update(
@@ -108,6 +116,30 @@ def _user_can_access(profile: SearchProfile, user: User) -> bool:
     return user in profile.viewers
 
 
+# Changes on every start, so cached pages are revalidated after a deploy
+_RENDER_EPOCH = uuid.uuid4().hex
+
+
+def _deals_page_etag(db: Session, user: User, profile: SearchProfile, all_profiles) -> str:
+    """
+    Validator for the deals page: covers everything it renders (the profile's
+    columns, the profile picker, its deals' latest update and the price stats)
+    without loading deals. Stats use a rolling window, so the date is part of it.
+    """
+    latest, count = db.query(func.max(Deal.updated_at), func.count(Deal.id)).filter(
+        Deal.profile_id == profile.id
+    ).one()
+    snapshots = db.query(
+        func.max(PriceSnapshot.recorded_at), func.count(PriceSnapshot.id), func.sum(PriceSnapshot.best_price)
+    ).filter(PriceSnapshot.profile_id == profile.id).one()
+    state = (
+        _RENDER_EPOCH, user.id, user.favourite_profile_id, latest, count, tuple(snapshots), date.today(),
+        [getattr(profile, a.key) for a in sa_inspect(SearchProfile).column_attrs],
+        [(p.id, p.name, p.user_id) for p in all_profiles],
+    )
+    return f'W/"{hashlib.blake2b(repr(state).encode(), digest_size=16).hexdigest()}"'
+
+
 # --- AUTH ROUTES ---
 
 @app.get("/login", response_class=HTMLResponse)
@@ -300,19 +332,22 @@ def alerts_page(
         .all()
     )
 
-    alert_items = []
-    for profile in all_profiles:
-        notify_dests = profile.notify_destinations
-        if not notify_dests:
-            continue
-
-        # Fetch deals for this profile
-        deals = db.query(Deal).options(
+    # Deals of every profile with belled destinations in one query, bucketed by profile
+    belled_profiles = [p for p in all_profiles if p.notify_destinations]
+    deals_by_profile = defaultdict(list)
+    if belled_profiles:
+        for d in db.query(Deal).options(
             joinedload(Deal.outbound),
             joinedload(Deal.inbound),
-            joinedload(Deal.profile),
-        ).filter(Deal.profile_id == profile.id).all()
-        deals = [d for d in deals if d.outbound and d.inbound]
+            selectinload(Deal.profile),
+        ).filter(Deal.profile_id.in_([p.id for p in belled_profiles])).all():
+            if d.outbound and d.inbound:
+                deals_by_profile[d.profile_id].append(d)
+
+    alert_items = []
+    for profile in belled_profiles:
+        notify_dests = profile.notify_destinations
+        deals = deals_by_profile[profile.id]
 
         # Group deals by destination (metro-area aware) + build name lookup
         grouped = defaultdict(list)
@@ -352,7 +387,7 @@ def alerts_page(
                 "destination_code": dest_code,
                 "destination_name": full_name.split(',')[0].strip(),
                 "country_code": country_code,
-                "country_flag": f"https://flagsapi.com/{country_code.upper()}/shiny/64.png",
+                "country_flag": get_country_flag_url(country_code),
                 "best_deal": best,
                 "profile": profile,
                 "is_shared": profile.user_id != user.id,
@@ -487,15 +522,19 @@ def view_deals(
             default_id = own[0].id if own else all_profiles[0].id
         return RedirectResponse(f"/?profile_id={default_id}", status_code=303)
 
-    # Fetch deals for this profile
-    deals = db.query(Deal).options(
-        joinedload(Deal.outbound),
-        joinedload(Deal.inbound),
-        joinedload(Deal.profile)
-    ).filter(Deal.profile_id == current_profile.id).all()
+    # Unchanged since the client's copy: skip the deal query and the render
+    etag = _deals_page_etag(db, user, current_profile, all_profiles)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cache_headers)
 
-    # Discard deals whose flights were pruned (orphaned FK safety net)
-    deals = [d for d in deals if d.outbound and d.inbound]
+    # Fetch deals for this profile, cheapest first. Inner joins drop deals whose
+    # flights were pruned (orphaned FK safety net) in SQL.
+    deals = db.query(Deal).options(
+        joinedload(Deal.outbound, innerjoin=True),
+        joinedload(Deal.inbound, innerjoin=True),
+        selectinload(Deal.profile)
+    ).filter(Deal.profile_id == current_profile.id).order_by(Deal.total_price_pp).all()
 
     view_data = group_deals_by_destination(deals)
 
@@ -513,6 +552,7 @@ def view_deals(
     return templates.TemplateResponse(
         name="deals.html",
         request=request,
+        headers=cache_headers,
         context={
             "user": user,
             "destinations": view_data,
@@ -560,11 +600,15 @@ def deal_detail(
 
     deals = (
         db.query(Deal)
-        .options(joinedload(Deal.outbound), joinedload(Deal.inbound), joinedload(Deal.profile))
+        .options(
+            joinedload(Deal.outbound, innerjoin=True),
+            joinedload(Deal.inbound, innerjoin=True),
+            selectinload(Deal.profile),
+        )
         .filter(Deal.profile_id == current_profile.id)
+        .order_by(Deal.total_price_pp)
         .all()
     )
-    deals = [d for d in deals if d.outbound and d.inbound]
 
     # Filter to destination, group by metro area
     from lesgoski.services.airports import get_nearby_set
@@ -573,7 +617,6 @@ def deal_detail(
         area = get_nearby_set(d.outbound.destination) | get_nearby_set(d.inbound.origin)
         if destination_code in area:
             matching.append(d)
-    matching.sort(key=lambda x: x.total_price_pp)
 
     if not matching:
         return RedirectResponse(f"/?profile_id={current_profile.id}", status_code=303)
@@ -584,7 +627,7 @@ def deal_detail(
     full_name = best_deal.outbound.destination_full or destination_code
     destination_name = full_name.split(',')[0].strip()
     country_code = get_country_code(full_name)
-    country_flag = f"https://flagsapi.com/{country_code.upper()}/shiny/64.png"
+    country_flag = get_country_flag_url(country_code)
     is_over = best_deal.total_price_pp > best_deal.profile.max_price
     stats = get_destination_stats(db, current_profile.id, destination_code)
 
@@ -662,8 +705,8 @@ async def save_profile(
         return HTMLResponse("At least one origin airport is required.", status_code=400)
     dest_list = [d.strip().upper() for d in allowed_destinations.split(',') if d.strip()]
     try:
-        strategy_dict = json.loads(strategy_json)
-        StrategyConfig(**strategy_dict)
+        # Parsed and validated in one pass by pydantic-core's JSON parser
+        StrategyConfig.model_validate_json(strategy_json)
     except Exception as e:
         return HTMLResponse(f"Invalid Strategy JSON: {e}", status_code=400)
 
@@ -977,7 +1020,7 @@ def main():
         "lesgoski.webapp.app:app",
         host=os.getenv("UVICORN_HOST", "127.0.0.1"),
         port=int(os.getenv("UVICORN_PORT", "8000")),
-        reload=os.getenv("UVICORN_RELOAD", "true").lower() == "true",
+        reload=WEBAPP_RELOAD,
     )
 
 
@@ -1,7 +1,6 @@
 # webapp/utils.py
 import json
 import os
-import urllib.parse
 from functools import lru_cache
 from lesgoski.database.models import Deal, Flight
 
@@ -17,37 +16,44 @@ def _load_country_mapping() -> dict:
 
     # exact name → code
     exact = {}
-    # list of (lowercase_name, code) for fuzzy fallback
+    # (name, code, word set, first word) for fuzzy fallback, tokenized once here
     all_entries = []
     for entry in entries:
-        name_lower = entry["name"].lower()
+        name_lower = entry["name"].casefold()
         code = entry["alpha-2"]
         exact[name_lower] = code
-        all_entries.append((name_lower, code))
+        words = name_lower.split()
+        all_entries.append((name_lower, code, frozenset(words), words[0]))
 
     return {"exact": exact, "all": all_entries}
 
 
+@lru_cache(maxsize=512)
 def get_country_code(full_name: str) -> str:
+    # Cached per full airport name: the same destinations recur on every page view
     if not full_name:
         return "EU"
 
-    country_name = full_name.split(",")[-1].strip().lower()
+    country_name = full_name.rpartition(",")[2].strip().casefold()
     mapping = _load_country_mapping()
 
     # 1. Exact match
-    if country_name in mapping["exact"]:
-        return mapping["exact"][country_name]
+    code = mapping["exact"].get(country_name)
+    if code:
+        return code
 
     # 2. Best fuzzy match — score each candidate and pick the highest
-    query_words = set(country_name.split())
+    query_list = country_name.split()
+    if not query_list:
+        return "EU"
+    query_words = set(query_list)
+    qry_first = query_list[0]
     best_code = None
     best_score = 0
     best_name_len = float("inf")  # tiebreaker: prefer shorter official names
 
-    for official_name, code in mapping["all"]:
+    for official_name, code, official_words, off_first in mapping["all"]:
         score = 0
-        official_words = set(official_name.split())
 
         # Shared words (strongest signal)
         shared = query_words & official_words
@@ -58,8 +64,6 @@ def get_country_code(full_name: str) -> str:
 
         # Starts-with on first word ("czech" → "czechia")
         if not shared and len(country_name) >= 5:
-            off_first = official_name.split()[0]
-            qry_first = country_name.split()[0]
             if len(qry_first) >= 5 and (
                 off_first.startswith(qry_first) or qry_first.startswith(off_first)
             ):
@@ -78,56 +82,65 @@ def get_country_code(full_name: str) -> str:
 
     return "EU"
 
+
+@lru_cache(maxsize=256)
+def get_country_flag_url(country_code: str) -> str:
+    return f"https://flagsapi.com/{country_code.upper()}/shiny/64.png"
+
+
+# Booking URL with the fixed query params baked in. Only IATA codes, ISO dates
+# and the adults count vary, none of which need percent-encoding; the param
+# order matches what urlencode produced from the original dict.
+_RYANAIR_URL_TEMPLATE = (
+    "https://www.ryanair.com/it/it/trip/flights/select"
+    "?adults={adults}&teens=0&children=0&infants=0&dateOut={d_out}"
+    "&isConnectedFlight=false&discount=0&promoCode="
+    "&originIata={orig}&destinationIata={dest}"
+    "&tpAdults={adults}&tpTeens=0&tpChildren=0&tpInfants=0&tpStartDate={d_out}"
+    "&tpDiscount=0&tpPromoCode=&tpOriginIata={orig}&tpDestinationIata={dest}"
+    "&isReturn={is_return}&dateIn={d_in}&tpEndDate={d_in}"
+)
+
+
 def _build_ryanair_url(flight: Flight, adults: int, return_flight: Flight = None):
     """
     Constructs the URL. If return_flight is provided, it's a round trip.
     Otherwise, it's a one-way trip.
     """
-    d_out = flight.departure_time.strftime('%Y-%m-%d')
-    orig = flight.origin
-    dest = flight.destination
-
-    params = {
-        "adults": adults,
-        "teens": 0, "children": 0, "infants": 0,
-        "dateOut": d_out,
-        "isConnectedFlight": "false",
-        "discount": 0, "promoCode": "",
-        "originIata": orig,
-        "destinationIata": dest,
-        "tpAdults": adults,
-        "tpTeens": 0, "tpChildren": 0, "tpInfants": 0,
-        "tpStartDate": d_out,
-        "tpDiscount": 0, "tpPromoCode": "",
-        "tpOriginIata": orig,
-        "tpDestinationIata": dest
-    }
-
     if return_flight:
         # Standard Round Trip
-        d_in = return_flight.departure_time.strftime('%Y-%m-%d')
-        params.update({
-            "isReturn": "true",
-            "dateIn": d_in,
-            "tpEndDate": d_in
-        })
+        is_return = "true"
+        d_in = return_flight.departure_time.date().isoformat()
     else:
         # One Way
-        params.update({
-            "isReturn": "false",
-            "dateIn": "",
-            "tpEndDate": ""
-        })
-
-    base_url = "https://www.ryanair.com/it/it/trip/flights/select"
-    return f"{base_url}?{urllib.parse.urlencode(params)}"
+        is_return = "false"
+        d_in = ""
+
+    return _RYANAIR_URL_TEMPLATE.format(
+        adults=adults,
+        d_out=flight.departure_time.date().isoformat(),
+        orig=flight.origin,
+        dest=flight.destination,
+        is_return=is_return,
+        d_in=d_in,
+    )
 
 def get_booking_links(deal: Deal) -> list[dict]:
     """
     Returns a list of button definitions: [{'label': '...', 'url': '...'}]
+    Memoized on the deal instance, keyed by the flights and adults it was built from,
+    since templates ask for the same deal's links more than once per render.
     """
     adults = deal.profile.adults if deal.profile.adults else 1
+    key = (deal.outbound_flight_id, deal.inbound_flight_id, adults)
+    cached = deal.__dict__.get('_cached_booking_links')
+    if cached is None or cached[0] != key:
+        cached = (key, _booking_links(deal, adults))
+        deal.__dict__['_cached_booking_links'] = cached
+    return cached[1]
+
 
+def _booking_links(deal: Deal, adults: int) -> list[dict]:
     # Check if standard round trip (A->B and B->A)
     is_standard = (deal.outbound.destination == deal.inbound.origin) and \
                   (deal.outbound.origin == deal.inbound.destination)
@@ -1,12 +1,12 @@
 """Shared test fixtures and factory helpers."""
 
-import hashlib
 import json
 import pytest
 from datetime import datetime
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from lesgoski.core.schemas import generate_flight_id
 from lesgoski.database.engine import Base
 from lesgoski.database.models import Flight, SearchProfile, Deal, User, BroskiRequest
 from lesgoski.webapp.auth import hash_password
@@ -24,12 +24,6 @@ def db():
     engine.dispose()
 
 
-def _flight_id(origin, destination, departure_time, adults):
-    """Compute the same MD5 id used by FlightSchema.unique_id."""
-    raw = f"{origin}_{destination}_{departure_time.isoformat()}_{adults}"
-    return hashlib.md5(raw.encode()).hexdigest()
-
-
 def make_flight(
     db,
     *,
@@ -50,7 +44,7 @@ def make_flight(
         from datetime import timedelta
         arrival_time = departure_time + timedelta(hours=2)
 
-    fid = _flight_id(origin, destination, departure_time, adults)
+    fid = generate_flight_id(origin, destination, departure_time, adults)
     flight = Flight(
         id=fid,
         origin=origin,
@@ -120,6 +114,31 @@ def make_profile(
     return profile
 
 
+def make_deal(db, profile, *, dest="BCN", price=60.0, notified=False, out_day=5, updated_at=None):
+    """Create and persist a PSA⇄dest round-trip Deal (July 2030) with its two flights, named "<dest> Airport"."""
+    dest_full = f"{dest} Airport"
+    out = make_flight(
+        db, origin="PSA", destination=dest, destination_full=dest_full,
+        departure_time=datetime(2030, 7, out_day, 18, 0),
+    )
+    inb = make_flight(
+        db, origin=dest, destination="PSA", origin_full=dest_full, destination_full="Pisa Airport, Italy",
+        departure_time=datetime(2030, 7, out_day + 2, 16, 0),
+    )
+    deal = Deal(
+        profile_id=profile.id,
+        outbound_flight_id=out.id,
+        inbound_flight_id=inb.id,
+        total_price_pp=price,
+        notified=notified,
+    )
+    if updated_at is not None:
+        deal.updated_at = updated_at
+    db.add(deal)
+    db.flush()
+    return deal
+
+
 def make_broski_request(db, *, from_user, to_user, status="pending"):
     """Create and persist a BroskiRequest."""
     req = BroskiRequest(
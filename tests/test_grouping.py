@@ -0,0 +1,34 @@
+"""Tests for services/grouping.py — metro-area deal grouping."""
+
+from types import SimpleNamespace
+
+from lesgoski.services.grouping import group_deals_by_destination
+
+
+def _deal(deal_id, dest, price, origin="PSA"):
+    out = SimpleNamespace(origin=origin, destination=dest, destination_full=f"{dest} Airport, Spain")
+    inb = SimpleNamespace(origin=dest, destination=origin, origin_full=f"{dest} Airport, Spain")
+    return SimpleNamespace(id=deal_id, outbound=out, inbound=inb, total_price_pp=price)
+
+
+def test_groups_sorted_cheapest_first_from_unsorted_input():
+    """BCN and GRO share a metro area; order must not depend on input order."""
+    deals = [_deal(1, "BCN", 90.0), _deal(2, "GRO", 40.0), _deal(3, "BCN", 60.0), _deal(4, "STN", 50.0)]
+    groups = {g["destination_code"]: g for g in group_deals_by_destination(deals)}
+
+    bcn = groups["BCN"]
+    assert bcn["best_deal"].id == 2
+    assert [d.id for d in bcn["other_deals"]] == [3, 1]
+
+    prices = [g["best_deal"].total_price_pp for g in group_deals_by_destination(deals)]
+    assert prices == sorted(prices)
+
+
+def test_repeated_deal_grouped_once():
+    """A deal listed twice appears once per group; no phantom nearby-only groups."""
+    bcn = _deal(1, "BCN", 60.0)
+    groups = group_deals_by_destination([bcn, bcn, _deal(2, "STN", 50.0)])
+
+    assert sorted(g["destination_code"] for g in groups) == ["BCN", "STN"]
+    bcn_group = next(g for g in groups if g["destination_code"] == "BCN")
+    assert bcn_group["best_deal"] is bcn and bcn_group["other_deals"] == []
@@ -1,114 +1,14 @@
 """Tests for services/matcher.py — deal matching logic."""
 
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import pytest
 
-from lesgoski.core.schemas import StrategyConfig
 from lesgoski.database.models import Flight, Deal
 from lesgoski.services.matcher import DealMatcher
 from tests.conftest import make_flight, make_profile
 
 
-# ---------------------------------------------------------------------------
-# Helper: build a minimal Flight-like object for _is_valid_match
-# ---------------------------------------------------------------------------
-
-@dataclass
-class _FlightStub:
-    """Lightweight stand-in for Flight — only the fields _is_valid_match reads."""
-    departure_time: datetime
-    arrival_time: datetime
-
-
-def _flight_stub(departure_time, arrival_time=None):
-    if arrival_time is None:
-        arrival_time = departure_time + timedelta(hours=2)
-    return _FlightStub(departure_time=departure_time, arrival_time=arrival_time)
-
-
-def _default_config(**overrides):
-    defaults = dict(
-        out_days={4: (17, 24)},   # Friday 17-24
-        in_days={6: (15, 23)},    # Sunday 15-23
-        min_nights=2,
-        max_nights=3,
-    )
-    defaults.update(overrides)
-    return StrategyConfig(**defaults)
-
-
-# ---------------------------------------------------------------------------
-# _is_valid_match — pure logic
-# ---------------------------------------------------------------------------
-
-class TestIsValidMatch:
-    """Tests for DealMatcher._is_valid_match (no DB needed)."""
-
-    def _matcher(self):
-        """Create a DealMatcher with a dummy db (not used by _is_valid_match)."""
-        m = DealMatcher.__new__(DealMatcher)
-        m.db = None
-        return m
-
-    def test_correct_weekday_and_time(self, monkeypatch):
-        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
-        out = _flight_stub(datetime(2025, 7, 4, 18, 0))   # Friday 18:00
-        inb = _flight_stub(datetime(2025, 7, 6, 16, 0))   # Sunday 16:00 (2 nights)
-        assert self._matcher()._is_valid_match(out, inb, _default_config()) is True
-
-    def test_wrong_outbound_weekday(self, monkeypatch):
-        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
-        out = _flight_stub(datetime(2025, 7, 3, 18, 0))   # Thursday
-        inb = _flight_stub(datetime(2025, 7, 6, 16, 0))
-        assert self._matcher()._is_valid_match(out, inb, _default_config()) is False
-
-    def test_wrong_inbound_weekday(self, monkeypatch):
-        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
-        out = _flight_stub(datetime(2025, 7, 4, 18, 0))   # Friday
-        inb = _flight_stub(datetime(2025, 7, 5, 16, 0))   # Saturday (not Sunday)
-        # Also only 1 night, below min_nights=2
-        assert self._matcher()._is_valid_match(out, inb, _default_config()) is False
-
-    def test_time_outside_window_beyond_tolerance(self, monkeypatch):
-        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
-        # Window is 17-24, tolerance=1 → effective range is hour >= 16.
-        # 15:00 is still below 16.
-        out = _flight_stub(datetime(2025, 7, 4, 15, 0))
-        inb = _flight_stub(datetime(2025, 7, 6, 16, 0))
-        assert self._matcher()._is_valid_match(out, inb, _default_config()) is False
-
-    def test_time_within_tolerance(self, monkeypatch):
-        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
-        # Window is 17-24, tolerance=1 → effective start is 16:00.
-        out = _flight_stub(datetime(2025, 7, 4, 16, 0))
-        inb = _flight_stub(datetime(2025, 7, 6, 16, 0))
-        assert self._matcher()._is_valid_match(out, inb, _default_config()) is True
-
-    def test_stay_too_short(self, monkeypatch):
-        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
-        out = _flight_stub(datetime(2025, 7, 4, 18, 0))   # Friday
-        inb = _flight_stub(datetime(2025, 7, 5, 16, 0))   # Saturday — 1 night < min 2
-        # Use config that accepts Saturday inbound
-        cfg = _default_config(in_days={5: (15, 23)})
-        assert self._matcher()._is_valid_match(out, inb, cfg) is False
-
-    def test_stay_too_long(self, monkeypatch):
-        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
-        out = _flight_stub(datetime(2025, 7, 4, 18, 0))   # Friday
-        inb = _flight_stub(datetime(2025, 7, 9, 16, 0))   # Wednesday — 5 nights > max 3
-        cfg = _default_config(in_days={2: (15, 23)})       # Accept Wednesday
-        assert self._matcher()._is_valid_match(out, inb, cfg) is False
-
-    def test_empty_out_days_rejects_all(self, monkeypatch):
-        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
-        out = _flight_stub(datetime(2025, 7, 4, 18, 0))
-        inb = _flight_stub(datetime(2025, 7, 6, 16, 0))
-        cfg = _default_config(out_days={})
-        assert self._matcher()._is_valid_match(out, inb, cfg) is False
-
-
 # ---------------------------------------------------------------------------
 # DealMatcher.run() — integration tests with in-memory SQLite
 # ---------------------------------------------------------------------------
@@ -226,3 +126,197 @@ class TestMatcherRun:
         matcher = DealMatcher(db=db)
         count = matcher.run(profile)
         assert count == 0
+
+    def test_allowed_destinations_filter(self, db, monkeypatch):
+        """Only destinations in profile_destinations match, in both passes."""
+        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
+        monkeypatch.setattr("lesgoski.services.matcher.NEARBY_AIRPORT_RADIUS_KM", 100)
+
+        for dest in ("BCN", "GRO"):
+            make_flight(db, origin="PSA", destination=dest,
+                        departure_time=datetime(2025, 7, 4, 18, 0), price=30)
+        make_flight(db, origin="BCN", destination="PSA",
+                    departure_time=datetime(2025, 7, 6, 16, 0), price=30,
+                    origin_full="Barcelona Airport, Spain",
+                    destination_full="Pisa Airport, Italy")
+        profile = make_profile(db, max_price=100, allowed_destinations=["GRO"])
+        db.flush()
+
+        assert [r.iata for r in profile.destination_rows] == ["GRO"]
+        assert DealMatcher(db=db).run(profile) == 1
+        deal = db.query(Deal).filter_by(profile_id=profile.id).one()
+        assert deal.outbound.destination == "GRO"
+
+    def test_rerun_keeps_notified_unless_price_changes(self, db, monkeypatch):
+        """Re-matching an unchanged pair keeps `notified`; a price change resets it."""
+        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
+        monkeypatch.setattr("lesgoski.services.matcher.NEARBY_AIRPORT_RADIUS_KM", 0)
+
+        out = make_flight(db, origin="PSA", destination="BCN",
+                          departure_time=datetime(2025, 7, 4, 18, 0), price=30)
+        make_flight(db, origin="BCN", destination="PSA",
+                    departure_time=datetime(2025, 7, 6, 16, 0), price=30,
+                    origin_full="Barcelona Airport, Spain",
+                    destination_full="Pisa Airport, Italy")
+        profile = make_profile(db, max_price=100)
+        db.flush()
+
+        matcher = DealMatcher(db=db)
+        matcher.run(profile)
+        deal = db.query(Deal).filter_by(profile_id=profile.id).one()
+        deal.notified = True
+        db.flush()
+
+        # Same price — stays notified, no duplicate row
+        matcher.run(profile)
+        db.expire_all()
+        deals = db.query(Deal).filter_by(profile_id=profile.id).all()
+        assert len(deals) == 1
+        assert deals[0].notified is True
+
+        # Price drop — flagged for notification again
+        out.price = 20
+        db.flush()
+        matcher.run(profile)
+        db.expire_all()
+        deal = db.query(Deal).filter_by(profile_id=profile.id).one()
+        assert deal.total_price_pp == 50.0
+        assert deal.notified is False
+
+    def test_unchanged_inputs_skip_rematch(self, db, monkeypatch):
+        """A rerun with the same flights and settings keeps deals untouched."""
+        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
+        monkeypatch.setattr("lesgoski.services.matcher.NEARBY_AIRPORT_RADIUS_KM", 0)
+
+        make_flight(db, origin="PSA", destination="BCN",
+                    departure_time=datetime(2025, 7, 4, 18, 0), price=30)
+        make_flight(db, origin="BCN", destination="PSA",
+                    departure_time=datetime(2025, 7, 6, 16, 0), price=30,
+                    origin_full="Barcelona Airport, Spain",
+                    destination_full="Pisa Airport, Italy")
+        profile = make_profile(db, max_price=100)
+        db.flush()
+
+        matcher = DealMatcher(db=db)
+        assert matcher.run(profile) == 1
+        first_update = db.query(Deal).filter_by(profile_id=profile.id).one().updated_at
+
+        assert matcher.run(profile) == 1
+        db.expire_all()
+        assert db.query(Deal).filter_by(profile_id=profile.id).one().updated_at == first_update
+
+        # A settings change invalidates the fingerprint: budget too low now
+        profile.max_price = 40
+        db.flush()
+        assert matcher.run(profile) == 0
+
+    def test_fingerprint_tracks_price_changes_and_deletions(self, db, monkeypatch):
+        """Flight changes that leave updated_at alone still force a rematch."""
+        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
+        monkeypatch.setattr("lesgoski.services.matcher.NEARBY_AIRPORT_RADIUS_KM", 0)
+
+        out = make_flight(db, origin="PSA", destination="BCN",
+                          departure_time=datetime(2025, 7, 4, 18, 0), price=30)
+        make_flight(db, origin="BCN", destination="PSA",
+                    departure_time=datetime(2025, 7, 6, 16, 0), price=30)
+        # Returns to a home airport but never pairs (Tuesday)
+        unpaired = make_flight(db, origin="STN", destination="PSA",
+                               departure_time=datetime(2025, 7, 8, 16, 0), price=30)
+        profile = make_profile(db, max_price=100)
+        db.flush()
+
+        matcher = DealMatcher(db=db)
+        assert matcher.run(profile) == 1
+        first = profile.match_fingerprint
+
+        out.price = 20
+        db.flush()
+        assert matcher.run(profile) == 1
+        assert db.query(Deal).filter_by(profile_id=profile.id).one().total_price_pp == 50.0
+        second = profile.match_fingerprint
+        assert second != first
+
+        db.delete(unpaired)
+        db.flush()
+        matcher.run(profile)
+        assert profile.match_fingerprint != second
+
+
+# ---------------------------------------------------------------------------
+# Strategy filters — day, hour window and stay length, as run() applies them
+# ---------------------------------------------------------------------------
+
+def _run_pair(db, out_dt, in_dt, strategy_dict=None):
+    """Seed one PSA⇄BCN round trip and return how many deals run() finds."""
+    make_flight(db, origin="PSA", destination="BCN",
+                departure_time=out_dt, price=30)
+    make_flight(db, origin="BCN", destination="PSA",
+                departure_time=in_dt, price=30,
+                origin_full="Barcelona Airport, Spain",
+                destination_full="Pisa Airport, Italy")
+    profile = make_profile(db, max_price=100, strategy_dict=strategy_dict)
+    db.flush()
+    return DealMatcher(db=db).run(profile)
+
+
+def _strategy(**overrides):
+    strategy = {
+        "out_days": {"4": [17, 24]},   # Friday 17-24
+        "in_days": {"6": [15, 23]},     # Sunday 15-23
+        "min_nights": 2,
+        "max_nights": 3,
+    }
+    strategy.update(overrides)
+    return strategy
+
+
+class TestStrategyFilters:
+    """run() keeps only pairs allowed by the profile's strategy (HOUR_TOLERANCE=1)."""
+
+    @pytest.fixture(autouse=True)
+    def _settings(self, monkeypatch):
+        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 1)
+        monkeypatch.setattr("lesgoski.services.matcher.NEARBY_AIRPORT_RADIUS_KM", 0)
+
+    def test_correct_weekday_and_time(self, db):
+        # Friday 18:00 → Sunday 16:00, 2 nights
+        assert _run_pair(db, datetime(2025, 7, 4, 18, 0), datetime(2025, 7, 6, 16, 0)) == 1
+
+    def test_wrong_outbound_weekday(self, db):
+        # Thursday outbound, strategy wants Friday
+        assert _run_pair(db, datetime(2025, 7, 3, 18, 0), datetime(2025, 7, 6, 16, 0)) == 0
+
+    def test_wrong_inbound_weekday(self, db):
+        # Saturday inbound, strategy wants Sunday
+        assert _run_pair(db, datetime(2025, 7, 4, 18, 0), datetime(2025, 7, 5, 16, 0),
+                         _strategy(min_nights=1)) == 0
+
+    def test_time_outside_window_beyond_tolerance(self, db):
+        # Window 17-24 with tolerance 1 starts at 16:00
+        assert _run_pair(db, datetime(2025, 7, 4, 15, 30), datetime(2025, 7, 6, 16, 0)) == 0
+
+    def test_time_within_tolerance(self, db):
+        assert _run_pair(db, datetime(2025, 7, 4, 16, 0), datetime(2025, 7, 6, 16, 0)) == 1
+
+    def test_inbound_window_end_tolerance(self, db):
+        # Sunday window 15-23 with tolerance 1 ends before 24:00
+        assert _run_pair(db, datetime(2025, 7, 4, 18, 0), datetime(2025, 7, 6, 23, 30)) == 1
+
+    def test_stay_too_short(self, db):
+        # Friday → Saturday: 1 night < min 2, Saturday inbound accepted
+        assert _run_pair(db, datetime(2025, 7, 4, 18, 0), datetime(2025, 7, 5, 16, 0),
+                         _strategy(in_days={"5": [15, 23]})) == 0
+
+    def test_stay_too_long(self, db):
+        # Friday → Sunday nine days later: right weekdays, 9 nights > max 3
+        assert _run_pair(db, datetime(2025, 7, 4, 18, 0), datetime(2025, 7, 13, 16, 0)) == 0
+
+    def test_empty_out_days_rejects_all(self, db):
+        assert _run_pair(db, datetime(2025, 7, 4, 18, 0), datetime(2025, 7, 6, 16, 0),
+                         _strategy(out_days={})) == 0
+
+    def test_monday_mapping(self, db, monkeypatch):
+        """Python weekday 0 (Monday) must map to SQLite %w = 1."""
+        monkeypatch.setattr("lesgoski.services.matcher.HOUR_TOLERANCE", 0)
+        strategy = _strategy(in_days={"0": [6, 12]}, min_nights=3, max_nights=3)
+        assert _run_pair(db, datetime(2025, 7, 4, 18, 0), datetime(2025, 7, 7, 9, 0), strategy) == 1
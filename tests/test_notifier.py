@@ -0,0 +1,94 @@
+"""Tests for services/notifier.py — push notifications for new deals."""
+
+import pytest
+
+from lesgoski.database.models import Deal
+from lesgoski.services import notifier
+from lesgoski.services.notifier import notify_new_deals, send_daily_digest
+from tests.conftest import make_deal, make_profile, make_user
+
+
+@pytest.fixture
+def posts(monkeypatch):
+    sent = []
+    monkeypatch.setattr(notifier._session, "post", lambda url, **kw: sent.append((url, kw)))
+    return sent
+
+
+class TestNotifyNewDeals:
+
+    def test_belled_destination_notified_once(self, db, posts):
+        profile = make_profile(db, user=make_user(db))
+        profile.notify_destinations = ["BCN"]
+        deal = make_deal(db, profile)
+
+        notify_new_deals(db, profile)
+        assert len(posts) == 1
+        assert deal.notified is True
+
+        # Nothing new since the last run: no repeat push
+        notify_new_deals(db, profile)
+        assert len(posts) == 1
+
+    def test_already_notified_deal_skipped(self, db, posts):
+        profile = make_profile(db, user=make_user(db))
+        profile.notify_destinations = ["BCN"]
+        make_deal(db, profile, notified=True)
+
+        notify_new_deals(db, profile)
+        assert posts == []
+
+    def test_belled_push_shows_cheapest_new_deal_only(self, db, posts):
+        profile = make_profile(db, user=make_user(db))
+        profile.notify_destinations = ["BCN"]
+        make_deal(db, profile, dest="BCN", price=70.0)
+        make_deal(db, profile, dest="BCN", price=55.0, out_day=12)
+        make_deal(db, profile, dest="STN", price=30.0)  # new but not belled
+
+        notify_new_deals(db, profile)
+
+        assert [kw["headers"]["Title"] for _, kw in posts] == ["BCN Airport 55EUR pp"]
+        assert db.query(Deal).filter_by(notified=False).count() == 0
+
+    def test_pricier_new_deal_does_not_repush_old_cheapest(self, db, posts):
+        profile = make_profile(db, user=make_user(db))
+        profile.notify_destinations = ["BCN"]
+        make_deal(db, profile, dest="BCN", price=40.0, notified=True)
+        make_deal(db, profile, dest="BCN", price=70.0, out_day=12)
+
+        notify_new_deals(db, profile)
+
+        assert [kw["headers"]["Title"] for _, kw in posts] == ["BCN Airport 70EUR pp"]
+
+
+class TestSendDailyDigest:
+
+    def test_one_digest_per_profile_with_deals(self, db, posts):
+        alice = make_profile(db, name="Alice", user=make_user(db))
+        bob = make_profile(db, name="Bob", user=make_user(db, username="bob", ntfy_topic="bob-topic"))
+        make_profile(db, name="Empty", user=make_user(db, username="carl"))
+        make_deal(db, alice, dest="BCN")
+        make_deal(db, bob, dest="STN", price=45.0)
+
+        send_daily_digest(db)
+
+        assert sorted(kw["headers"]["Title"] for _, kw in posts) == [
+            "Daily Flight Digest - Alice", "Daily Flight Digest - Bob",
+        ]
+        assert {url for url, _ in posts} == {
+            "https://ntfy.sh/lesgoski-test-42", "https://ntfy.sh/bob-topic",
+        }
+
+    def test_digest_lists_cheapest_deal_per_destination(self, db, posts):
+        profile = make_profile(db, user=make_user(db))
+        make_deal(db, profile, dest="BCN", price=80.0)
+        make_deal(db, profile, dest="BCN", price=55.0, out_day=12)
+        make_deal(db, profile, dest="STN", price=40.0)
+
+        send_daily_digest(db)
+
+        assert len(posts) == 1
+        assert posts[0][1]["data"] == (
+            "STN Airport: 40EUR (05/07-07/07)\n"
+            "BCN Airport: 55EUR (12/07-14/07)"
+        )
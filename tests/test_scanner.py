@@ -0,0 +1,165 @@
+"""Tests for services/scanner.py — flight scanning and upserts."""
+
+import threading
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("ryanair")
+
+from lesgoski.core.schemas import generate_flight_id
+from lesgoski.database.models import Flight, ScanLog
+from lesgoski.services import scanner
+from lesgoski.services.scanner import FlightScanner, _fetch_cached
+
+
+def _api_flight(origin, destination, departure_time, price=29.99, adults=1):
+    """Stand-in for a ryanair API flight — only the fields the scanner reads."""
+    return SimpleNamespace(
+        origin=origin,
+        destination=destination,
+        departureTime=departure_time,
+        arrivalTime=departure_time + timedelta(hours=2),
+        flightNumber="FR1234",
+        price=price,
+        currency="EUR",
+        originFull=f"{origin} Airport, Italy",
+        destinationFull=f"{destination} Airport, Spain",
+        adults=adults,
+    )
+
+
+@pytest.fixture(autouse=True)
+def _empty_fetch_cache():
+    scanner._fetch_cache.clear()
+    yield
+    scanner._fetch_cache.clear()
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """Record every API request instead of sending it; tests set `respond`."""
+    calls = []
+    state = SimpleNamespace(calls=calls, respond=lambda *args: [])
+
+    def fake_fetch(airport, adults, date_from, date_to, destination_airport=None):
+        calls.append((airport, destination_airport))
+        return state.respond(airport, destination_airport)
+
+    monkeypatch.setattr(scanner, "_fetch_cheapest", fake_fetch)
+    return state
+
+
+_DAYS = (date(2030, 7, 1), date(2030, 9, 1))
+
+
+class TestFetchCached:
+
+    def test_concurrent_callers_share_one_fetch(self, api_calls):
+        release = threading.Event()
+        result = [object()]
+
+        def slow_respond(*args):
+            release.wait(5)
+            return result
+        api_calls.respond = slow_respond
+
+        got = []
+        threads = [
+            threading.Thread(target=lambda: got.append(_fetch_cached("PSA", 1, *_DAYS)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        assert api_calls.calls == [("PSA", None)]
+        assert len(got) == 5 and all(r is result for r in got)
+
+    def test_failed_fetch_not_cached(self, api_calls):
+        def fail_once(*args):
+            if len(api_calls.calls) == 1:
+                raise RuntimeError("API down")
+            return ["ok"]
+        api_calls.respond = fail_once
+
+        with pytest.raises(RuntimeError):
+            _fetch_cached("PSA", 1, *_DAYS)
+        assert _fetch_cached("PSA", 1, *_DAYS) == ["ok"]
+        assert len(api_calls.calls) == 2
+
+    def test_entries_expire_after_ttl(self, api_calls, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(scanner.time, "monotonic", lambda: clock[0])
+        monkeypatch.setattr(scanner, "SCAN_COOLDOWN_MINUTES", 1)
+
+        _fetch_cached("PSA", 1, *_DAYS)
+        clock[0] += 59
+        _fetch_cached("PSA", 1, *_DAYS)
+        assert len(api_calls.calls) == 1
+
+        clock[0] += 2  # 61s after the first fetch
+        _fetch_cached("PSA", 1, *_DAYS)
+        assert len(api_calls.calls) == 2
+
+
+class TestBulkUpsert:
+
+    def test_rows_visible_in_caller_session(self, db):
+        dep = datetime(2030, 7, 5, 18, 0)
+        scanner = FlightScanner(db=db)
+
+        scanner._bulk_upsert([_api_flight("PSA", "BCN", dep, price=30.0)])
+        flight = db.get(Flight, generate_flight_id("PSA", "BCN", dep, 1))
+        assert flight is not None and flight.price == 30.0
+
+        # Same flight again: updated in place, not duplicated
+        scanner._bulk_upsert([_api_flight("PSA", "BCN", dep, price=24.5)])
+        db.expire_all()
+        assert db.query(Flight).count() == 1
+        assert db.get(Flight, flight.id).price == 24.5
+
+
+class TestRun:
+
+    def test_every_return_leg_fetched_and_upserted_once(self, db, api_calls):
+        routes = {"PSA": ["BCN", "GRO", "STN"], "BLQ": ["BCN", "GRO"]}
+        out_dep = datetime(2030, 7, 5, 18, 0)
+        in_dep = datetime(2030, 7, 7, 16, 0)
+
+        def respond(airport, destination_airport):
+            if destination_airport is None:
+                return [_api_flight(airport, dest, out_dep) for dest in routes[airport]]
+            return [_api_flight(airport, destination_airport, in_dep)]
+        api_calls.respond = respond
+
+        total = FlightScanner(db=db).run(origins=["PSA", "BLQ"], adults=1)
+
+        expected_legs = {(dest, origin) for origin, dests in routes.items() for dest in dests}
+        return_legs = [call for call in api_calls.calls if call[1] is not None]
+        assert sorted(return_legs) == sorted(expected_legs)
+        assert sorted(c for c in api_calls.calls if c[1] is None) == [("BLQ", None), ("PSA", None)]
+
+        assert total == 10
+        assert db.query(Flight).count() == 10
+        assert {(f.origin, f.destination) for f in db.query(Flight).filter(Flight.departure_time == in_dep)} == expected_legs
+        assert db.query(ScanLog).count() == 2
+
+    def test_failed_origin_does_not_block_other_scan_logs(self, db, api_calls):
+        out_dep = datetime(2030, 7, 5, 18, 0)
+
+        def respond(airport, destination_airport):
+            if destination_airport is None:
+                return [_api_flight(airport, "BCN", out_dep)]
+            if destination_airport == "BLQ":
+                raise RuntimeError("API down")
+            return []
+        api_calls.respond = respond
+
+        with pytest.raises(RuntimeError):
+            FlightScanner(db=db).run(origins=["PSA", "BLQ"], adults=1)
+
+        assert [log.origin for log in db.query(ScanLog)] == ["PSA"]
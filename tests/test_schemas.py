@@ -45,6 +45,14 @@ def test_flight_unique_id_matches_expected_hash():
     assert fs.unique_id == expected
 
 
+def test_flight_unique_id_is_cached_and_schema_frozen():
+    """unique_id is computed once; the frozen model keeps the cache valid."""
+    fs = _make_flight_schema()
+    assert fs.unique_id is fs.unique_id
+    with pytest.raises(ValidationError):
+        fs.origin = "BLQ"
+
+
 def test_flight_unique_id_differs_by_origin():
     a = _make_flight_schema(origin="PSA")
     b = _make_flight_schema(origin="BLQ")
@@ -161,3 +169,41 @@ def test_empty_in_days_allowed():
         max_nights=3,
     )
     assert cfg.in_days == {}
+
+
+def test_profile_strategy_object_cached_until_reassigned():
+    from lesgoski.database.models import SearchProfile
+
+    profile = SearchProfile()
+    profile.strategy_object = StrategyConfig(out_days={4: (17, 24)}, in_days={6: (15, 23)}, min_nights=2, max_nights=3)
+    first = profile.strategy_object
+    assert profile.strategy_object is first
+
+    profile.strategy_object = StrategyConfig(out_days={3: (8, 12)}, in_days={6: (15, 23)}, min_nights=2, max_nights=3)
+    assert profile.strategy_object is not first
+    assert profile.strategy_object.out_days == {3: (8, 12)}
+
+
+def test_profile_json_lists_cached_and_copied():
+    from lesgoski.database.models import SearchProfile
+
+    profile = SearchProfile()
+    profile.notify_destinations = ["BCN"]
+    first = profile.notify_destinations
+    first.append("GRO")  # caller mutation must not leak into the cached value
+    assert profile.notify_destinations == ["BCN"]
+
+    profile.notify_destinations = ["BCN", "STN"]
+    assert profile.notify_destinations == ["BCN", "STN"]
+    profile.notify_destinations = []
+    assert profile.notify_destinations == []
+
+
+def test_profile_json_list_write_primes_cache(monkeypatch):
+    from lesgoski.database import models
+
+    profile = models.SearchProfile()
+    profile.allowed_destinations = ["BCN", "GRO"]
+    monkeypatch.setattr(models.json, "loads", lambda raw: pytest.fail("re-parsed after write"))
+    assert profile.allowed_destinations == ["BCN", "GRO"]
+    assert [r.iata for r in profile.destination_rows] == ["BCN", "GRO"]
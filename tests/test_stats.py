@@ -0,0 +1,40 @@
+"""Tests for services/stats.py — daily price snapshots."""
+
+from lesgoski.database.models import PriceSnapshot
+from lesgoski.services.stats import record_price_snapshots
+from tests.conftest import make_deal, make_profile
+
+
+class TestRecordPriceSnapshots:
+
+    def test_one_snapshot_per_destination_per_day(self, db):
+        profile = make_profile(db)
+        make_deal(db, profile, price=80.0)
+
+        record_price_snapshots(db, profile)
+        db.flush()
+        record_price_snapshots(db, profile)
+        db.flush()
+
+        snaps = db.query(PriceSnapshot).filter(PriceSnapshot.destination_code == "BCN").all()
+        assert len(snaps) == 1
+        assert snaps[0].best_price == 80.0
+
+    def test_keeps_lowest_price_of_the_day(self, db):
+        profile = make_profile(db)
+        deal = make_deal(db, profile, price=80.0)
+        record_price_snapshots(db, profile)
+        db.flush()
+
+        deal.total_price_pp = 60.0
+        db.flush()
+        record_price_snapshots(db, profile)
+        db.flush()
+
+        deal.total_price_pp = 70.0
+        db.flush()
+        record_price_snapshots(db, profile)
+        db.flush()
+
+        snap = db.query(PriceSnapshot).filter(PriceSnapshot.destination_code == "BCN").one()
+        assert snap.best_price == 60.0
@@ -0,0 +1,77 @@
+"""Tests for webapp/app.py — deals page conditional requests."""
+
+import importlib
+from datetime import date, datetime
+
+import pytest
+from starlette.requests import Request
+
+pytest.importorskip("ryanair")
+
+from lesgoski.database import engine as db_engine
+from lesgoski.database.models import PriceSnapshot
+from tests.conftest import make_deal, make_profile, make_user
+
+
+@pytest.fixture
+def webapp(monkeypatch):
+    """The app module, imported without creating the on-disk database."""
+    monkeypatch.setattr(db_engine, "init_db", lambda: None)
+    return importlib.import_module("lesgoski.webapp.app")
+
+
+def _request(headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": raw})
+
+
+def _deals_page(db):
+    user = make_user(db)
+    profile = make_profile(db, user=user)
+    deal = make_deal(db, profile, updated_at=datetime(2030, 1, 1))
+    return user, profile, deal
+
+
+class TestDealsPageETag:
+
+    def test_matching_if_none_match_returns_304(self, db, webapp):
+        user, profile, _ = _deals_page(db)
+        etag = webapp._deals_page_etag(db, user, profile, [profile])
+
+        response = webapp.view_deals(
+            _request({"If-None-Match": etag}), profile_id=profile.id, db=db, user=user
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+    def test_deal_or_profile_update_changes_etag(self, db, webapp):
+        user, profile, deal = _deals_page(db)
+        etag = lambda: webapp._deals_page_etag(db, user, profile, [profile])
+        first = etag()
+        assert etag() == first
+
+        deal.updated_at = datetime(2030, 1, 2)
+        db.flush()
+        second = etag()
+        assert second != first
+
+        profile.max_price = 80.0
+        db.flush()
+        assert etag() != second
+
+    def test_new_snapshot_or_new_day_changes_etag(self, db, webapp, monkeypatch):
+        user, profile, _ = _deals_page(db)
+        etag = lambda: webapp._deals_page_etag(db, user, profile, [profile])
+        first = etag()
+
+        db.add(PriceSnapshot(
+            profile_id=profile.id, destination_code="BCN", best_price=60.0,
+            advance_days=30, recorded_at=datetime(2030, 1, 1),
+        ))
+        db.flush()
+        second = etag()
+        assert second != first
+
+        # The stats window rolls over at midnight even with no new data
+        monkeypatch.setattr(webapp, "date", type("Tomorrow", (), {"today": staticmethod(lambda: date(2099, 1, 1))}))
+        assert etag() != second
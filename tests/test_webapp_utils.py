@@ -4,7 +4,7 @@ from datetime import datetime
 
 import pytest
 
-from lesgoski.webapp.utils import get_country_code, get_booking_links
+from lesgoski.webapp.utils import get_country_code, get_country_flag_url, get_booking_links
 from lesgoski.database.models import Deal, Flight, SearchProfile
 from tests.conftest import make_flight, make_profile
 
@@ -40,6 +40,10 @@ def test_country_code_unknown():
     assert get_country_code("Somewhere, Neverland") == "EU"
 
 
+def test_country_flag_url():
+    assert get_country_flag_url("es") == "https://flagsapi.com/ES/shiny/64.png"
+
+
 # ---------------------------------------------------------------------------
 # get_booking_links
 # ---------------------------------------------------------------------------
@@ -99,3 +103,15 @@ def test_booking_links_cross_airport(db):
     assert links[1]["label"] == "Book Return"
     assert "isReturn=false" in links[0]["url"]
     assert "isReturn=false" in links[1]["url"]
+
+
+def test_booking_links_memoized_per_deal(db):
+    """Repeat calls reuse the built links until the deal's flights change."""
+    deal = _make_deal_in_db(db, out_dest="BCN", in_origin="BCN")
+    links = get_booking_links(deal)
+    assert get_booking_links(deal) is links
+
+    deal.profile.adults = 2
+    rebuilt = get_booking_links(deal)
+    assert rebuilt is not links
+    assert "adults=2" in rebuilt[0]["url"]